@@ -1,11 +1,26 @@
 """Movie API"""
 
-from datetime import datetime
-from flask import Flask, jsonify, request
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as DecodeError
+from datetime import date, datetime
+from functools import wraps
+from itertools import islice
+import json
+from os import environ, getpid
+from time import perf_counter
+from typing import Callable, Iterator, Mapping
+
+from flask import Flask, Response, g, jsonify, request, url_for
+from psycopg2 import DataError, Error, IntegrityError
+from werkzeug.http import is_resource_modified
+
 from database import (
+    MOVIE_FIELDS,
+    CompactRows,
     get_movies,
     get_movie_by_id,
-    create_movie,
+    get_movie_details,
+    upsert_movies,
     update_movie,
     delete_movie,
     get_genres,
@@ -13,14 +28,91 @@ from database import (
     get_movies_by_genre,
     search_actor,
     get_movie_by_country,
-    get_countries
+    stream_movies_by_genre,
+    stream_movies_by_country,
+    get_countries,
+    get_pool_stats,
+    get_report,
+    REPORTS,
+    get_dimension_cache_stats,
+    get_slow_queries,
+    get_table_versions
 )
+from json_provider import create_json_provider
+from metrics import end_trace, gauges, render_metrics, request_latency, server_timing, start_trace
+from response_compression import compress_response
 
 # Note from the Movie DB API team: This half-finished code was written by an intern
 # with no coding experience so expect there to be bugs and issues.
 # Please review the code and make any necessary changes to ensure it's production-ready. Good luck!
 
 app = Flask(__name__)
+app.json = create_json_provider(app)
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BATCH_IDS = 100
+MAX_BATCH_MOVIES = 5000
+REQUIRED_MOVIE_FIELDS = ["title", "release_date", "genre", "country", "language"]
+TEXT_MOVIE_FIELDS = ["overview", "orig_title", "status"]
+NUMBER_MOVIE_FIELDS = ["score", "budget", "revenue"]
+MAX_LANGUAGE_LENGTH = 100
+# The type of the keyset value each sort_by orders by, as found in a cursor
+SORT_KEY_TYPES = {"title": str, "genre": str, "release_date": date, "revenue": float,
+                  "budget": float, "score": float}
+# Have Postgres encode pages of movies as JSON instead of building a dict per row
+JSON_FROM_DATABASE = environ.get("JSON_FROM_DATABASE") == "1"
+COMPRESS_MIN_SIZE = int(environ.get("COMPRESS_MIN_SIZE", 1024))
+
+
+@app.before_request
+def start_request_timer() -> None:
+    """Start timing the request and collecting its queries"""
+    g.started = perf_counter()
+    start_trace()
+
+
+@app.after_request
+def record_request_timing(response: Response) -> Response:
+    """Record the request's latency and report where its time went in Server-Timing"""
+    elapsed = perf_counter() - g.get("started", perf_counter())
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    request_latency.observe(elapsed, request.method, route, response.status_code)
+    response.headers["Server-Timing"] = server_timing(elapsed, end_trace())
+    return response
+
+
+@app.after_request
+def compress(response: Response) -> Response:
+    """Compress large responses with the best encoding the client accepts"""
+    return compress_response(response, request, COMPRESS_MIN_SIZE)
+
+
+def conditional(*tables: str) -> Callable:
+    """Answer a GET with 304 Not Modified, without running the view, when none of
+    the tables it reads have changed since the client's ETag or Last-Modified.
+
+    Validators are only sent when the tables did not change while the view ran,
+    so they never describe newer data than the response holds."""
+    def decorator(view: Callable) -> Callable:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            version, last_modified = get_table_versions(tables)
+            if not is_resource_modified(request.environ, etag=version,
+                                        last_modified=last_modified):
+                response = Response(status=304)
+                response.set_etag(version, weak=True)
+                response.last_modified = last_modified
+                return response
+
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed \
+                    and get_table_versions(tables) == (version, last_modified):
+                response.set_etag(version, weak=True)
+                response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
 
 
 def validate_sort_by(sort_by: str | None) -> bool:
@@ -33,6 +125,220 @@ def validate_sort_order(sort_order: str) -> bool:
     return sort_order in ["asc", "desc"]
 
 
+def validate_movie_fields(movie: dict) -> dict:
+    """Validate the fields of a movie that are given (not None), returning them
+    with the release date parsed"""
+    fields = {field: value for field, value in movie.items() if value is not None}
+
+    blank = [field for field in REQUIRED_MOVIE_FIELDS if field in fields
+             and (not isinstance(fields[field], str) or not fields[field].strip())]
+    if blank:
+        raise ValueError(f"Missing required fields: {', '.join(blank)}")
+
+    if not all(isinstance(fields.get(field, ""), str) for field in TEXT_MOVIE_FIELDS):
+        raise ValueError("overview, orig_title and status must be strings")
+
+    if "country" in fields and len(fields["country"].strip()) != 2:
+        raise ValueError("country must be a 2 letter code")
+
+    if "language" in fields and len(fields["language"].strip()) > MAX_LANGUAGE_LENGTH:
+        raise ValueError(f"language must be at most {MAX_LANGUAGE_LENGTH} characters")
+
+    if "release_date" in fields:
+        try:
+            fields["release_date"] = datetime.strptime(fields["release_date"], "%m/%d/%Y").date()
+        except ValueError as e:
+            raise ValueError("Invalid release_date format. Please use MM/DD/YYYY") from e
+
+    actors = fields.get("actors", [])
+    if not isinstance(actors, list) or not all(isinstance(actor, str) for actor in actors):
+        raise ValueError("actors must be a list of alternating actor and role names")
+
+    numbers = [fields.get(field, 0) for field in NUMBER_MOVIE_FIELDS]
+    if not all(isinstance(number, (int, float)) and not isinstance(number, bool)
+               for number in numbers):
+        raise ValueError("score, budget and revenue must be numbers")
+
+    return fields
+
+
+def validate_movie(movie: dict) -> dict:
+    """Validate a movie to create and fill in the optional fields"""
+    if not isinstance(movie, dict):
+        raise ValueError("Movie must be an object")
+
+    missing = [field for field in REQUIRED_MOVIE_FIELDS
+               if not isinstance(movie.get(field), str) or not movie[field].strip()]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    fields = validate_movie_fields(movie)
+    return {"title": fields["title"],
+            "release_date": fields["release_date"],
+            "genre": fields["genre"],
+            "actors": fields.get("actors", []),
+            "overview": fields.get("overview", ""),
+            "orig_title": fields.get("orig_title", fields["title"]),
+            "status": fields.get("status", "released"),
+            "country": fields["country"],
+            "language": fields["language"],
+            **{field: fields.get(field, 0) for field in NUMBER_MOVIE_FIELDS}}
+
+
+def get_batch_body() -> list:
+    """Get the movies of a batch from a JSON array or newline delimited JSON body"""
+    try:
+        if request.mimetype == "application/x-ndjson":
+            movies = [json.loads(line) for line in request.get_data(as_text=True).splitlines()
+                      if line.strip()]
+        else:
+            movies = json.loads(request.get_data(as_text=True))
+    except ValueError as e:
+        raise ValueError("Invalid batch body") from e
+
+    if not isinstance(movies, list) or not 1 <= len(movies) <= MAX_BATCH_MOVIES:
+        raise ValueError(f"Batch must be a list of 1 to {MAX_BATCH_MOVIES} movies")
+    return movies
+
+
+def parse_ids(ids: str) -> list[int]:
+    """Parse a comma separated list of movie ids"""
+    try:
+        movie_ids = [int(movie_id) for movie_id in ids.split(",")]
+    except ValueError as e:
+        raise ValueError("Invalid ids parameter") from e
+
+    if not 1 <= len(movie_ids) <= MAX_BATCH_IDS:
+        raise ValueError("Invalid ids parameter")
+    return movie_ids
+
+
+def encode_cursor(sort_by: str | None, sort_order: str, after: list,
+                  search: str | None = None) -> str:
+    """Encode the keyset of the last row of a page as an opaque token"""
+    data = json.dumps([sort_by, sort_order, search, after], default=str)
+    return urlsafe_b64encode(data.encode()).decode()
+
+
+def is_keyset_value(value, key_type: type) -> bool:
+    """Check a value from a cursor can be compared with a sort key of key_type"""
+    if isinstance(value, bool):
+        return False
+    if key_type is float:
+        return isinstance(value, (int, float))
+    if key_type is date:
+        try:
+            date.fromisoformat(value)
+        except (TypeError, ValueError):
+            return False
+        return True
+    return isinstance(value, key_type)
+
+
+def decode_cursor(token: str, sort_by: str | None, sort_order: str,
+                  search: str | None = None) -> list:
+    """Decode a token from encode_cursor, checking it belongs to the same ordering and
+    search and holds the keyset values of that ordering: the sort key, or the search
+    rank, followed by the movie id"""
+    try:
+        token_sort_by, token_sort_order, token_search, after = \
+            json.loads(urlsafe_b64decode(token))
+    except (DecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    key_types = [int]
+    if sort_by:
+        key_types.insert(0, SORT_KEY_TYPES[sort_by])
+    elif search:
+        key_types.insert(0, float)
+
+    if (token_sort_by, token_sort_order, token_search) != (sort_by, sort_order, search) \
+            or not isinstance(after, list) or len(after) != len(key_types) \
+            or not all(map(is_keyset_value, after, key_types)):
+        raise ValueError("Invalid cursor")
+    return after
+
+
+def get_page_args(args: Mapping, sort_by: str | None, sort_order: str,
+                  search: str | None = None) -> tuple[list | None, int, list | None]:
+    """Get the after, limit and fields query parameters"""
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        raise ValueError("Invalid limit parameter") from e
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError("Invalid limit parameter")
+
+    fields = args.get("fields")
+    if fields is not None:
+        fields = fields.split(",")
+        if not set(fields) <= set(MOVIE_FIELDS):
+            raise ValueError("Invalid fields parameter")
+
+    after = args.get("after")
+    if after is not None:
+        after = decode_cursor(after, sort_by, sort_order, search)
+
+    return after, limit, fields
+
+
+def page_response(rows: list[dict] | CompactRows | str, next_after: list | None,
+                  sort_by: str | None, sort_order: str, search: str | None = None) -> Response:
+    """Respond with a page of rows, in the columnar shape for CompactRows or as JSON
+    already encoded by the database, linking to the next page if there is one"""
+    if isinstance(rows, str):
+        response = app.response_class(rows, mimetype=app.json.mimetype)
+    elif isinstance(rows, CompactRows):
+        response = jsonify(rows.to_json())
+    else:
+        response = jsonify(rows)
+    if next_after is not None:
+        token = encode_cursor(sort_by, sort_order, next_after, search)
+        args = {**request.args.to_dict(), "after": token}
+        response.headers["X-Next-Cursor"] = token
+        response.headers["Link"] = \
+            f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+
+def ndjson_response(rows: Iterator[dict]) -> Response:
+    """Stream rows as newline delimited JSON while they are fetched"""
+    return Response((app.json.dumps(row) + "\n" for row in rows),
+                    mimetype="application/x-ndjson")
+
+
+def columns_response(rows: Iterator[list | tuple], batch_size: int = 1000) -> Response:
+    """Stream a columnar JSON document while the rows are fetched: the column names
+    from the first item, then every row as an array, encoded batch_size rows at a time"""
+    columns = next(rows, [])
+
+    def chunks() -> Iterator[str]:
+        yield '{"columns":' + app.json.dumps(columns) + ',"rows":['
+        separator = ""
+        while batch := list(islice(rows, batch_size)):
+            yield separator + app.json.dumps(batch)[1:-1]
+            separator = ","
+        yield "]}\n"
+
+    return Response(chunks(), mimetype="application/json")
+
+
+def get_compact_arg(args: Mapping) -> bool:
+    """Check whether the client asked for the columnar response shape"""
+    row_format = args.get("format")
+    if row_format not in ["columns", None]:
+        raise ValueError("Invalid format parameter")
+    return row_format == "columns"
+
+
+def get_stream_arg(args: Mapping) -> bool:
+    """Check whether the client asked for a streamed response"""
+    stream = args.get("stream")
+    if stream not in ["ndjson", None]:
+        raise ValueError("Invalid stream parameter")
+    return stream == "ndjson"
+
+
 @app.route("/", methods=["GET"])
 def endpoint_index():
     """Endpoint index"""
@@ -40,8 +346,23 @@ def endpoint_index():
 
 
 @app.route("/movies", methods=["GET"])
+@conditional("movies", "genre_assignment", "crew_assignment", "genres", "actors", "roles",
+             "languages", "countries")
 def endpoint_get_movies():
     """Endpoint get movies"""
+    if "ids" in request.args:
+        try:
+            movie_ids = parse_ids(request.args["ids"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        movies = get_movie_details(movie_ids)
+
+        if not movies:
+            return jsonify({"error": "No movies found"}), 404
+
+        return jsonify(movies), 200
+
     sort_by = request.args.get("sort_by")
     sort_order = request.args.get("sort_order", "asc")
     search = request.args.get("search")
@@ -52,79 +373,142 @@ def endpoint_get_movies():
     if not validate_sort_order(sort_order):
         return jsonify({"error": "Invalid sort_order parameter"}), 400
 
-    movies = get_movies(search, sort_by, sort_order)
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order, search)
+        compact = get_compact_arg(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    movies, next_after = get_movies(search, sort_by, sort_order, after, limit, fields,
+                                    JSON_FROM_DATABASE and not compact, compact)
 
     if not movies:
         return jsonify({"error": "No movies found"}), 404
 
-    return jsonify(movies), 200
+    return page_response(movies, next_after, sort_by, sort_order, search), 200
 
 
 @app.route("/movies", methods=["POST"])
 def endpoint_post_movies():
-    """Endpoint post movies"""
-    data = request.get_json
-    title = data.get["title"]
-    release_date = data.get["release_date"]
-    genre = data.get["genre"]
-    actors = data.get("actors", [])
-    overview: str = data.get("overview", "")
-    status = data.get("status", "released")
-    budget: int = data.get("budget", 0)
-    revenue: int = data.get("revenue", 0)
-    country: str = data.get("country")
-    language: str = data.get("language")
-
-    if not any([title, release_date, genre, country, language, actors]):
-        return jsonify({"error": "Missing required fields"}), 400
-
+    """Create a movie, or update the movie with the same title"""
     try:
-        datetime.strptime(release_date, "%m/%d/%Y")
-    except ValueError:
-        return jsonify({"error": "Invalid release_date format. Please use MM/DD/YYYY"}), 400
+        movie = validate_movie(request.get_json())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        movie = create_movie(title, release_date, genre, actors, overview,
-                             status, budget, revenue, country, language)
+        [saved] = upsert_movies([movie])
+    except (DataError, IntegrityError) as e:
+        return jsonify({"error": f"Invalid movie data: {e.diag.message_primary or e}"}), 400
+    except Error:
+        return jsonify({"error": "Could not save the movie"}), 500
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 500
+
+    if saved["created"]:
         return jsonify({"message": "Movie created successfully",
                         'success': True,
-                        "movie": movie}), 201
+                        "movie": saved}), 201
+    return jsonify({"message": "Movie updated successfully",
+                    'success': True,
+                    "movie": saved}), 200
 
+
+@app.route("/movies/batch", methods=["POST"])
+def endpoint_post_movies_batch():
+    """Create or update many movies by title in one transaction.
+    Returns a result for every movie; invalid movies are skipped, not saved."""
+    try:
+        movies = get_batch_body()
     except ValueError as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400
+
+    results: list[dict] = [{} for _ in movies]
+    valid, titles = [], set()
+    for index, movie in enumerate(movies):
+        try:
+            movie = validate_movie(movie)
+            if movie["title"] in titles:
+                raise ValueError("Duplicate title in batch")
+        except ValueError as e:
+            results[index] = {"index": index, "success": False, "error": str(e)}
+            continue
+
+        titles.add(movie["title"])
+        valid.append((index, movie))
+
+    if valid:
+        try:
+            saved = upsert_movies([movie for _, movie in valid])
+        except (DataError, IntegrityError) as e:
+            return jsonify({"error": f"Invalid movie data: {e.diag.message_primary or e}"}), 400
+        except Error:
+            return jsonify({"error": "Could not save the batch"}), 500
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 500
+
+        for (index, _), row in zip(valid, saved):
+            results[index] = {"index": index, "success": True, **row}
+
+    return jsonify({"created": sum(result.get("created", False) for result in results),
+                    "updated": sum(result.get("created") is False for result in results),
+                    "failed": len(movies) - len(valid),
+                    "results": results}), 200
 
 
 @app.route("/movies/<int:movie_id>", methods=["PATCH"])
 def endpoint_patch_movie(movie_id: int):
     """Endpoint patch movie"""
-    data = request.get_json
-    title = data.get("title")
-    release_date = data.get("release_date")
-    genre = data.get("genre")
-    actors = data.get("actors")
-    overview = data.get("overview")
-    status = data.get("status")
-    budget = data.get("budget")
-    revenue = data.get("revenue")
-    country = data.get("country")
-    language = data.get("language")
-
-    if not all([title, release_date, genre, actors, overview,
-                status, budget, revenue, country, language]):
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"error": "Body must be a JSON object"}), 400
+
+    try:
+        fields = validate_movie_fields(
+            {field: data.get(field) for field in ["title", "release_date", "genre", "actors",
+                                                  "overview", "status", "budget", "revenue",
+                                                  "country", "language"]})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not fields:
         return jsonify({"error": "No fields to update"}), 400
 
+    title = fields.get("title")
+    release_date = fields.get("release_date")
+    genre = fields.get("genre")
+    actors = fields.get("actors")
+    overview = fields.get("overview")
+    status = fields.get("status")
+    budget = fields.get("budget")
+    revenue = fields.get("revenue")
+    country = fields.get("country")
+    language = fields.get("language")
+
     try:
         movie = update_movie(title, release_date, genre, actors,
                              overview, status, budget, revenue, country, language, movie_id)
-        return jsonify({'success': True, "movie": movie}), 200
+    except (DataError, IntegrityError) as e:
+        return jsonify({"error": f"Invalid movie data: {e.diag.message_primary or e}"}), 400
+    except Error:
+        return jsonify({"error": "Could not save the movie"}), 500
     except ValueError as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), 400
+
+    if movie is None:
+        return jsonify({"error": "Movie not found"}), 404
+
+    return jsonify({'success': True, "movie": movie}), 200
 
 
 @app.route("/movies/<int:movie_id>", methods=["GET"])
 def endpoint_get_movie(movie_id: int):
-    """Endpoint get movie"""
-    movie = get_movie_by_id(movie_id)
+    """Endpoint get movie.
+    With expand=true the movie includes its language, country, genres and crew."""
+    if request.args.get("expand") in ["true", "1"]:
+        movie = next(iter(get_movie_details([movie_id])), None)
+    else:
+        movie = get_movie_by_id(movie_id)
 
     if not movie:
         return jsonify({"error": "Movie not found"}), 404
@@ -151,22 +535,49 @@ def endpoint_get_genres():
     if not genres:
         return jsonify({"error": "No genres found"}), 404
 
-    return jsonify(genres)
+    response = jsonify(genres)
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @app.route("/genres/<int:genre_id>/movies", methods=["GET"])
+@conditional("movies", "genre_assignment", "genres")
 def endpoint_movies_by_genre(genre_id: int):
     """Get list of movie details by genre"""
 
+    sort_by = request.args.get("sort_by")
+    sort_order = request.args.get("sort_order", "asc")
+
+    if not validate_sort_by(sort_by):
+        return jsonify({"error": "Invalid sort_by parameter"}), 400
+
+    if not validate_sort_order(sort_order):
+        return jsonify({"error": "Invalid sort_order parameter"}), 400
+
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order)
+        stream = get_stream_arg(request.args)
+        compact = get_compact_arg(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     if not get_genre(genre_id):
         return jsonify({"error": "Genre not found"}), 404
 
-    movies = get_movies_by_genre(genre_id)
+    if stream and compact:
+        return columns_response(stream_movies_by_genre(genre_id, sort_by, sort_order, fields,
+                                                       compact=True))
+    if stream:
+        return ndjson_response(stream_movies_by_genre(genre_id, sort_by, sort_order, fields))
+
+    movies, next_after = get_movies_by_genre(genre_id, sort_by, sort_order, after, limit,
+                                             fields, JSON_FROM_DATABASE and not compact,
+                                             compact)
 
     if not movies:
         return jsonify({"error": "No movies found for this genre"}), 404
 
-    return jsonify(movies)
+    return page_response(movies, next_after, sort_by, sort_order)
 
 
 @app.route("/actors", methods=["GET"])
@@ -187,6 +598,7 @@ def endpoint_search_actor():
 
 
 @app.route("/countries/<string:country_code>", methods=["GET"])
+@conditional("movies", "countries")
 def endpoint_get_movies_by_country(country_code: str):
     """Get a list of movie details by country.
     Optionally, the results can be sorted by a specific field in ascending or descending order."""
@@ -195,7 +607,7 @@ def endpoint_get_movies_by_country(country_code: str):
         return jsonify({"error": "Country not found"}), 404
 
     sort_by = request.args.get("sort_by")
-    sort_order = request.args.get("sort_order")
+    sort_order = request.args.get("sort_order", "asc")
 
     if not validate_sort_by(sort_by):
         return jsonify({"error": "Invalid sort_by parameter"}), 400
@@ -203,13 +615,73 @@ def endpoint_get_movies_by_country(country_code: str):
     if not validate_sort_order(sort_order):
         return jsonify({"error": "Invalid sort_order parameter"}), 400
 
-    movies = get_movie_by_country(country_code, sort_by, sort_order)
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order)
+        stream = get_stream_arg(request.args)
+        compact = get_compact_arg(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if stream and compact:
+        return columns_response(stream_movies_by_country(country_code, sort_by,
+                                                         sort_order, fields, compact=True))
+    if stream:
+        return ndjson_response(stream_movies_by_country(country_code, sort_by,
+                                                        sort_order, fields))
+
+    movies, next_after = get_movie_by_country(country_code, sort_by, sort_order, after, limit,
+                                              fields, JSON_FROM_DATABASE and not compact,
+                                              compact)
 
     if not movies:
         return jsonify({"error": "No movies found for this country"}), 404
 
-    return jsonify(movies)
+    return page_response(movies, next_after, sort_by, sort_order)
+
+
+@app.route("/stats/<string:report>", methods=["GET"])
+def endpoint_get_report(report: str):
+    """Get a precomputed report: countries, genres, languages or genre-countries"""
+    if report not in REPORTS:
+        return jsonify({"error": "Report not found"}), 404
+
+    return jsonify(get_report(report))
+
+
+@app.route("/stats/pool", methods=["GET"])
+def endpoint_get_pool_stats():
+    """Get database connection pool usage for monitoring"""
+    return jsonify(get_pool_stats())
+
+
+@app.route("/stats/cache", methods=["GET"])
+def endpoint_get_cache_stats():
+    """Get lookup table cache hit and miss counters"""
+    return jsonify(get_dimension_cache_stats())
+
+
+@app.route("/stats/slow-queries", methods=["GET"])
+def endpoint_get_slow_queries():
+    """Get the statements slower than SLOW_QUERY_MS with their plans, most time consuming first"""
+    slow_queries = get_slow_queries()
+
+    if slow_queries is None:
+        return jsonify({"error": "Slow query log is not enabled"}), 404
+
+    return jsonify(slow_queries)
+
+
+@app.route("/metrics", methods=["GET"])
+def endpoint_get_metrics():
+    """Get request and query latency, pool and cache metrics in the Prometheus text format"""
+    pid = str(getpid())
+    return Response(render_metrics(
+        gauges("db_pool", "Connection pool usage and counters", "pid",
+               {pid: get_pool_stats()}),
+        gauges("dimension_cache", "Lookup table cache size, hits and misses", "table",
+               get_dimension_cache_stats())),
+        mimetype="text/plain; version=0.0.4")
 
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=environ.get("FLASK_DEBUG") == "1", host="0.0.0.0", port=5000)
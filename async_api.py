@@ -0,0 +1,269 @@
+"""Async Movie API
+
+Serves the read routes of api.py with the same queries through an async
+connection pool, so one process can keep hundreds of requests in flight:
+
+    hypercorn async_api:app --bind 0.0.0.0:5000
+
+Writes (POST, PATCH and DELETE) are still served by api.py.
+"""
+
+from os import environ
+from typing import AsyncIterator
+
+from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from quart import Quart, Response, jsonify, request, url_for
+
+from api import (
+    encode_cursor,
+    get_page_args,
+    get_stream_arg,
+    parse_ids,
+    validate_sort_by,
+    validate_sort_order
+)
+from database import (
+    MOVIE_DETAILS_QUERY,
+    MOVIE_QUERY,
+    REPORTS,
+    SEARCH_ACTOR_QUERY,
+    movies_by_country_query,
+    movies_by_genre_query,
+    movies_query,
+    split_page
+)
+
+app = Quart(__name__)
+pool: AsyncConnectionPool | None = None
+
+
+@app.before_serving
+async def open_pool() -> None:
+    """Open the connection pool when the server starts"""
+    global pool  # pylint: disable=global-statement
+
+    load_dotenv()
+    pool = AsyncConnectionPool(
+        make_conninfo(user=environ["DATABASE_USERNAME"],
+                      password=environ["DATABASE_PASSWORD"],
+                      host=environ["DATABASE_IP"],
+                      port=environ["DATABASE_PORT"],
+                      dbname=environ["DATABASE_NAME"]),
+        min_size=int(environ.get("DATABASE_POOL_MIN_SIZE", 1)),
+        max_size=int(environ.get("DATABASE_POOL_MAX_SIZE", 10)),
+        timeout=float(environ.get("DATABASE_POOL_TIMEOUT", 5)),
+        open=False)
+    await pool.open()
+
+
+@app.after_serving
+async def close_pool() -> None:
+    """Close the connection pool when the server stops"""
+    await pool.close()
+
+
+async def fetch_all(query: str, params: tuple | list = ()) -> list[dict]:
+    """Run a query on a pooled connection and return every row"""
+    async with pool.connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(query, params)
+        return await cur.fetchall()
+
+
+async def iter_rows(query: str, params: list, itersize: int = 2000) -> AsyncIterator[dict]:
+    """Yield the rows of a query from a server-side cursor"""
+    async with pool.connection() as conn, \
+            conn.cursor(name="movie_stream", row_factory=dict_row) as cur:
+        cur.itersize = itersize
+        await cur.execute(query, params)
+        async for row in cur:
+            row.pop("sort_key", None)
+            yield row
+
+
+async def page_response(query: str, params: list, limit: int,
+                        sort_by: str | None, sort_order: str, error: str,
+                        search: str | None = None) -> Response:
+    """Respond with a page of movies, linking to the next page if there is one"""
+    movies, next_after = split_page(await fetch_all(query, params), limit)
+
+    if not movies:
+        return jsonify({"error": error}), 404
+
+    response = jsonify(movies)
+    if next_after is not None:
+        token = encode_cursor(sort_by, sort_order, next_after, search)
+        args = {**request.args.to_dict(), "after": token}
+        response.headers["X-Next-Cursor"] = token
+        response.headers["Link"] = \
+            f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+
+def ndjson_response(rows: AsyncIterator[dict]) -> Response:
+    """Stream rows as newline delimited JSON while they are fetched"""
+    async def lines():
+        async for row in rows:
+            yield app.json.dumps(row) + "\n"
+
+    return Response(lines(), mimetype="application/x-ndjson")
+
+
+@app.route("/", methods=["GET"])
+async def endpoint_index():
+    """Endpoint index"""
+    return jsonify({"message": "Welcome to the Movie API"})
+
+
+@app.route("/movies", methods=["GET"])
+async def endpoint_get_movies():
+    """Endpoint get movies"""
+    if "ids" in request.args:
+        try:
+            movie_ids = parse_ids(request.args["ids"])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        movies = await fetch_all(MOVIE_DETAILS_QUERY, (movie_ids, movie_ids))
+
+        if not movies:
+            return jsonify({"error": "No movies found"}), 404
+
+        return jsonify(movies), 200
+
+    sort_by = request.args.get("sort_by")
+    sort_order = request.args.get("sort_order", "asc")
+
+    if not validate_sort_by(sort_by):
+        return jsonify({"error": "Invalid sort_by parameter"}), 400
+
+    if not validate_sort_order(sort_order):
+        return jsonify({"error": "Invalid sort_order parameter"}), 400
+
+    search = request.args.get("search")
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order, search)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query, params = movies_query(search, sort_by, sort_order, after, limit, fields)
+    return await page_response(query, params, limit, sort_by, sort_order, "No movies found",
+                               search)
+
+
+@app.route("/movies/<int:movie_id>", methods=["GET"])
+async def endpoint_get_movie(movie_id: int):
+    """Endpoint get movie"""
+    if request.args.get("expand") in ["true", "1"]:
+        movies = await fetch_all(MOVIE_DETAILS_QUERY, ([movie_id], [movie_id]))
+    else:
+        movies = await fetch_all(MOVIE_QUERY, (movie_id,))
+
+    if not movies:
+        return jsonify({"error": "Movie not found"}), 404
+
+    return jsonify(movies[0]), 200
+
+
+@app.route("/genres", methods=["GET"])
+async def endpoint_get_genres():
+    """Get a list of all genres"""
+    genres = await fetch_all("SELECT * FROM genres")
+
+    if not genres:
+        return jsonify({"error": "No genres found"}), 404
+
+    return jsonify(genres)
+
+
+@app.route("/genres/<int:genre_id>/movies", methods=["GET"])
+async def endpoint_movies_by_genre(genre_id: int):
+    """Get list of movie details by genre"""
+    sort_by = request.args.get("sort_by")
+    sort_order = request.args.get("sort_order", "asc")
+
+    if not validate_sort_by(sort_by):
+        return jsonify({"error": "Invalid sort_by parameter"}), 400
+
+    if not validate_sort_order(sort_order):
+        return jsonify({"error": "Invalid sort_order parameter"}), 400
+
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order)
+        stream = get_stream_arg(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not await fetch_all("SELECT genre FROM genres WHERE genre_id = %s", (genre_id,)):
+        return jsonify({"error": "Genre not found"}), 404
+
+    if stream:
+        return ndjson_response(iter_rows(*movies_by_genre_query(
+            genre_id, sort_by, sort_order, limit=None, fields=fields)))
+
+    query, params = movies_by_genre_query(genre_id, sort_by, sort_order, after, limit, fields)
+    return await page_response(query, params, limit, sort_by, sort_order,
+                               "No movies found for this genre")
+
+
+@app.route("/actors", methods=["GET"])
+async def endpoint_search_actor():
+    """Search actors and the films each of them has appeared in"""
+    search_term = request.args.get("search")
+
+    if not search_term:
+        return jsonify({"error": "Search term empty found"}), 404
+
+    actors = await fetch_all(SEARCH_ACTOR_QUERY, (f"%{search_term}%", search_term))
+
+    if not actors:
+        return jsonify({"error": "No actors found"}), 404
+
+    return jsonify(actors)
+
+
+@app.route("/countries/<string:country_code>", methods=["GET"])
+async def endpoint_get_movies_by_country(country_code: str):
+    """Get a list of movie details by country"""
+    if not await fetch_all("SELECT country FROM countries WHERE country = %s",
+                           (country_code,)):
+        return jsonify({"error": "Country not found"}), 404
+
+    sort_by = request.args.get("sort_by")
+    sort_order = request.args.get("sort_order", "asc")
+
+    if not validate_sort_by(sort_by):
+        return jsonify({"error": "Invalid sort_by parameter"}), 400
+
+    if not validate_sort_order(sort_order):
+        return jsonify({"error": "Invalid sort_order parameter"}), 400
+
+    try:
+        after, limit, fields = get_page_args(request.args, sort_by, sort_order)
+        stream = get_stream_arg(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if stream:
+        return ndjson_response(iter_rows(*movies_by_country_query(
+            country_code, sort_by, sort_order, limit=None, fields=fields)))
+
+    query, params = movies_by_country_query(country_code, sort_by, sort_order,
+                                            after, limit, fields)
+    return await page_response(query, params, limit, sort_by, sort_order,
+                               "No movies found for this country")
+
+
+@app.route("/stats/<string:report>", methods=["GET"])
+async def endpoint_get_report(report: str):
+    """Get a precomputed report: countries, genres, languages or genre-countries"""
+    if report not in REPORTS:
+        return jsonify({"error": "Report not found"}), 404
+
+    return jsonify(await fetch_all(REPORTS[report]))
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port=5000)
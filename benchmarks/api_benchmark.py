@@ -0,0 +1,212 @@
+"""Measure the latency and throughput of every api.py route and of the importer
+
+Seeds a throwaway database (see benchmarks/common.py) with a synthetic catalogue,
+loads each route of a gunicorn or Flask server in turn and times
+import_movies_to_database. Run from the repository root:
+
+    python -m benchmarks.api_benchmark --movies 100000
+    python -m benchmarks.api_benchmark --movies 1000000 --container --compare api_benchmark.json
+
+Use --container to run against a Postgres container started with docker
+instead of the server in the BENCHMARK_DATABASE_* settings.
+"""
+
+import json
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from os import environ
+from typing import Callable
+
+from benchmarks.common import (
+    apply_schema,
+    benchmark_settings,
+    create_database,
+    get_benchmark_connection,
+    save_results,
+    seed_movies,
+    start_postgres_container,
+    stop_postgres_container,
+    summarise,
+    time_calls
+)
+from benchmarks.http_load import (
+    get,
+    load_routes,
+    python_command,
+    server_environment,
+    start_server,
+    stop_server
+)
+
+SERVERS = {
+    "flask": python_command("-m", "flask", "--app", "api", "run", "--port", "5111",
+                            "--with-threads", "--no-reload", "--no-debugger"),
+    "gunicorn": python_command("-m", "gunicorn", "--config", "gunicorn.conf.py",
+                               "--bind", "127.0.0.1:5111", "api:app"),
+}
+URL = "http://127.0.0.1:5111"
+
+
+def new_movie(title: str) -> dict:
+    """Build a request body for a movie that is not in the seeded catalogue"""
+    return {"title": title,
+            "release_date": "06/15/2001",
+            "genre": "Genre 1, Genre 2",
+            "actors": ["Actor 1", "Role 1", "Actor 2", "Role 2"],
+            "overview": f"The story of {title}",
+            "status": "Released",
+            "score": 7.5,
+            "budget": 1000000,
+            "revenue": 3000000,
+            "country": "AC",
+            "language": "Language 1"}
+
+
+def routes(movies: int) -> dict[str, Callable[[int], tuple]]:
+    """Describe a request for every route of api.py, by name.
+
+    Requests that take a movie id spread over the catalogue; deletes run last
+    and remove each movie once."""
+    def movie_id(n: int) -> int:
+        return 1 + n * 7919 % movies
+
+    return {
+        "GET /": get("/"),
+        "GET /movies": get("/movies?limit=100"),
+        "GET /movies?sort_by": get("/movies?sort_by=score&sort_order=desc&limit=100"),
+        "GET /movies?search": lambda n: ("GET", f"/movies?search=Movie%20{movie_id(n)}", None),
+        "GET /movies?ids": lambda n: (
+            "GET", "/movies?ids=" + ",".join(str(movie_id(n + i)) for i in range(20)), None),
+        "GET /movies/<id>": lambda n: ("GET", f"/movies/{movie_id(n)}", None),
+        "GET /movies/<id>?expand": lambda n: ("GET", f"/movies/{movie_id(n)}?expand=true", None),
+        "POST /movies": lambda n: ("POST", "/movies", new_movie(f"Benchmark movie {n}")),
+        "POST /movies/batch": lambda n: (
+            "POST", "/movies/batch",
+            [new_movie(f"Benchmark batch {n} movie {i}") for i in range(100)]),
+        "PATCH /movies/<id>": lambda n: (
+            "PATCH", f"/movies/{movie_id(n)}", {"budget": n % 100 * 1000, "genre": "Genre 3"}),
+        "GET /genres": get("/genres"),
+        "GET /genres/<id>/movies": lambda n: (
+            "GET", f"/genres/{1 + n % 20}/movies?sort_by=release_date&limit=100", None),
+        "GET /genres/<id>/movies?stream": get("/genres/20/movies?stream=ndjson"),
+        "GET /actors": lambda n: ("GET", f"/actors?search=Actor%20{movie_id(n) // 5}", None),
+        "GET /countries/<code>": get("/countries/AC?sort_by=title&limit=100"),
+        "GET /countries/<code>?stream": get("/countries/AZ?stream=ndjson"),
+        "GET /stats/<report>": lambda n: (
+            "GET", f"/stats/{['countries', 'genres', 'languages', 'genre-countries'][n % 4]}",
+            None),
+        "GET /stats/pool": get("/stats/pool"),
+        "GET /stats/cache": get("/stats/cache"),
+        "DELETE /movies/<id>": lambda n: ("DELETE", f"/movies/{movies - n}", None),
+    }
+
+
+def csv_row(title: str) -> dict:
+    """Build a row as import_movie.py reads it from imdb_movies.csv"""
+    return {"title": title,
+            "release_date": "06/15/2001",
+            "score": "75",
+            "genre": "Genre 1,\xa0Genre 2",
+            "overview": f"The story of {title}",
+            "crew": "Actor 1, Role 1, Actor 2, Role 2, New actor for " + title + ", Role 3",
+            "orig_title": title,
+            "status": "Released",
+            "language": "Language 1",
+            "budget": "1000000",
+            "revenue": "3000000",
+            "country": "AC"}
+
+
+def benchmark_import(settings: dict, batches: int, batch_size: int) -> dict:
+    """Time import_movies_to_database on batches of new movies"""
+    # Imported here so the connection pool reads the benchmark settings
+    environ.update(server_environment(settings))
+    from connection_pool import reset_pool  # pylint: disable=import-outside-toplevel
+    from import_movie import import_movies_to_database  # pylint: disable=import-outside-toplevel
+    reset_pool()
+
+    counter = iter(range(batches))
+
+    def run():
+        batch = next(counter)
+        import_movies_to_database([csv_row(f"Imported batch {batch} movie {i}")
+                                   for i in range(batch_size)])
+
+    latencies = time_calls(run, batches)
+    reset_pool()
+    return {"batch_size": batch_size,
+            "rows_per_second": round(batches * batch_size / (sum(latencies) / 1000), 1),
+            "latency_ms": summarise(latencies)}
+
+
+def compare(results: dict, path: str) -> None:
+    """Print how every route changed since a previous run"""
+    with open(path, encoding="utf-8") as f:
+        previous = json.load(f)
+
+    print(f"\nCompared with {path} ({previous['movies']} movies)")
+    for name, route in results["routes"].items():
+        before = previous["routes"].get(name)
+        if not before or not before["latency_ms"] or not route["latency_ms"]:
+            continue
+        print(f"{name}: p50 {before['latency_ms']['p50']} -> {route['latency_ms']['p50']} ms, "
+              f"p99 {before['latency_ms']['p99']} -> {route['latency_ms']['p99']} ms, "
+              f"{before['requests_per_second']} -> {route['requests_per_second']} req/s")
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=100000,
+                        help="catalogue size, e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--server", choices=SERVERS, default="gunicorn")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--import-batches", type=int, default=20)
+    parser.add_argument("--import-batch-size", type=int, default=100)
+    parser.add_argument("--container", action="store_true")
+    parser.add_argument("--compare", help="a previous results file to compare with")
+    parser.add_argument("--output", default="api_benchmark.json")
+    args = parser.parse_args()
+
+    settings = benchmark_settings()
+    container = None
+    if args.container:
+        container, settings = start_postgres_container(settings)
+
+    try:
+        create_database(settings)
+        conn = get_benchmark_connection(settings)
+        apply_schema(conn)
+        seed_movies(conn, args.movies)
+        conn.close()
+
+        results = {"movies": args.movies,
+                   "server": args.server,
+                   "concurrency": args.concurrency,
+                   "duration": args.duration,
+                   "started": datetime.now(timezone.utc).isoformat()}
+
+        process = start_server(SERVERS[args.server], URL, server_environment(settings))
+        try:
+            results["routes"] = load_routes(URL, routes(args.movies),
+                                            args.concurrency, args.duration)
+        finally:
+            stop_server(process)
+
+        results["import_movies_to_database"] = benchmark_import(
+            settings, args.import_batches, args.import_batch_size)
+        print(f"import_movies_to_database: "
+              f"{results['import_movies_to_database']['rows_per_second']} rows/s")
+    finally:
+        if container:
+            stop_postgres_container(container)
+
+    if args.compare:
+        compare(results, args.compare)
+
+    save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Helpers shared by the benchmarks: a throwaway database and a synthetic catalogue"""
+
+import json
+import subprocess
+from os import environ
+from pathlib import Path
+from statistics import quantiles
+from time import perf_counter, sleep
+
+from dotenv import load_dotenv
+from psycopg2 import OperationalError, connect
+from psycopg2.extensions import connection, ISOLATION_LEVEL_AUTOCOMMIT
+
+from movie_documents import refresh_documents
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def benchmark_settings() -> dict:
+    """Get the connection settings of the benchmark database.
+
+    BENCHMARK_DATABASE_NAME must name a database that is safe to drop and recreate;
+    the other settings fall back to the ones the API uses."""
+    load_dotenv()
+    return {"user": environ.get("BENCHMARK_DATABASE_USERNAME", environ.get("DATABASE_USERNAME")),
+            "password": environ.get("BENCHMARK_DATABASE_PASSWORD",
+                                    environ.get("DATABASE_PASSWORD")),
+            "host": environ.get("BENCHMARK_DATABASE_IP", environ.get("DATABASE_IP")),
+            "port": environ.get("BENCHMARK_DATABASE_PORT", environ.get("DATABASE_PORT")),
+            "database": environ.get("BENCHMARK_DATABASE_NAME", "movies_benchmark")}
+
+
+def create_database(settings: dict) -> None:
+    """Drop and recreate the benchmark database"""
+    if settings["database"] == environ.get("DATABASE_NAME"):
+        raise ValueError("The benchmark database must not be the API database")
+
+    admin = connect(**{**settings, "database": "postgres"})
+    admin.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    with admin.cursor() as cur:
+        cur.execute(f"DROP DATABASE IF EXISTS {settings['database']}")
+        cur.execute(f"CREATE DATABASE {settings['database']}")
+    admin.close()
+
+
+def get_benchmark_connection(settings: dict) -> connection:
+    """Connect to the benchmark database"""
+    return connect(**settings)
+
+
+def run_sql_file(conn: connection, path: Path) -> None:
+    """Run every statement of a SQL file"""
+    with conn.cursor() as cur:
+        cur.execute(path.read_text(encoding="utf-8"))
+    conn.commit()
+
+
+def apply_schema(conn: connection) -> None:
+    """Create the tables, indexes and migrations from scratch"""
+    run_sql_file(conn, ROOT / "schema.sql")
+    for migration in sorted((ROOT / "migrations").glob("*.sql")):
+        run_sql_file(conn, migration)
+
+
+def seed_movies(conn: connection, movies: int, seed: float = 0.42) -> None:
+    """Fill the database with a reproducible synthetic catalogue.
+
+    Languages, countries and genres are few and skewed towards the first ids,
+    actors are shared by many movies with a long tail, like the real catalogue."""
+    people = max(movies // 5, 10)
+    with conn.cursor() as cur:
+        cur.execute("SELECT SETSEED(%s)", (seed,))
+        cur.execute("""INSERT INTO languages (language)
+                    SELECT 'Language ' || i FROM GENERATE_SERIES(1, 50) i""")
+        cur.execute("""INSERT INTO countries (country)
+                    SELECT CHR(65 + i / 26) || CHR(65 + i % 26)
+                    FROM GENERATE_SERIES(0, 199) i""")
+        cur.execute("""INSERT INTO genres (genre)
+                    SELECT 'Genre ' || i FROM GENERATE_SERIES(1, 20) i""")
+        cur.execute("""INSERT INTO actors (actor)
+                    SELECT 'Actor ' || i FROM GENERATE_SERIES(1, %s) i""", (people,))
+        cur.execute("""INSERT INTO roles (role)
+                    SELECT 'Role ' || i FROM GENERATE_SERIES(1, %s) i""", (people,))
+        cur.execute("""INSERT INTO movies (title, release_date, score, overview, orig_title,
+                        status, language_id, budget, revenue, country_id)
+                    SELECT 'Movie ' || i,
+                        DATE '1950-01-01' + (RANDOM() * 27000)::INT,
+                        ROUND((RANDOM() * 100)::NUMERIC) / 10,
+                        'The story of movie ' || i || ' ' || MD5(i::TEXT),
+                        'Movie ' || i,
+                        'Released',
+                        1 + (RANDOM() ^ 3 * 49)::INT,
+                        (RANDOM() * 200000000)::INT,
+                        (RANDOM() * 500000000)::INT,
+                        1 + (RANDOM() ^ 4 * 199)::INT
+                    FROM GENERATE_SERIES(1, %s) i""", (movies,))
+        cur.execute("""INSERT INTO genre_assignment (movie_id, genre_id)
+                    SELECT DISTINCT movie_id, 1 + (RANDOM() ^ 2 * 19)::INT
+                    FROM movies, GENERATE_SERIES(1, 3)""")
+        cur.execute("""INSERT INTO crew_assignment (movie_id, actor_id, role_id)
+                    SELECT movie_id, 1 + (RANDOM() ^ 3 * (%s - 1))::INT,
+                        1 + (RANDOM() * (%s - 1))::INT
+                    FROM movies, GENERATE_SERIES(1, 5)""", (people, people))
+        refresh_documents(cur)
+        cur.execute("ANALYZE")
+    conn.commit()
+
+
+def time_calls(function, repeat: int) -> list[float]:
+    """Call a function repeatedly and return each call's latency in milliseconds"""
+    latencies = []
+    for _ in range(repeat):
+        started = perf_counter()
+        function()
+        latencies.append((perf_counter() - started) * 1000)
+    return latencies
+
+
+def summarise(latencies: list[float]) -> dict:
+    """Summarise latencies in milliseconds as percentiles"""
+    if len(latencies) < 2:
+        latencies = latencies * 2
+    cuts = quantiles(latencies, n=100, method="inclusive")
+    return {"count": len(latencies),
+            "p50": round(cuts[49], 3),
+            "p95": round(cuts[94], 3),
+            "p99": round(cuts[98], 3)}
+
+
+def save_results(results: dict, path: str) -> None:
+    """Save benchmark results as JSON for comparing runs"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Saved results to {path}")
+
+
+def start_postgres_container(settings: dict, image: str = "postgres:16",
+                             timeout: float = 60) -> tuple[str, dict]:
+    """Start a throwaway Postgres container and return its id and connection settings"""
+    password = settings["password"] or "benchmark"
+    container = subprocess.run(
+        ["docker", "run", "--detach", "--rm", "--publish", "127.0.0.1::5432",
+         "--env", f"POSTGRES_USER={settings['user'] or 'postgres'}",
+         "--env", f"POSTGRES_PASSWORD={password}", image],
+        check=True, capture_output=True, text=True).stdout.strip()
+    port = subprocess.run(["docker", "port", container, "5432/tcp"], check=True,
+                          capture_output=True, text=True).stdout.split(":")[-1].strip()
+    settings = {**settings, "user": settings["user"] or "postgres", "password": password,
+                "host": "127.0.0.1", "port": port}
+
+    deadline = perf_counter() + timeout
+    while True:
+        try:
+            connect(**{**settings, "database": "postgres"}).close()
+            return container, settings
+        except OperationalError:
+            if perf_counter() > deadline:
+                stop_postgres_container(container)
+                raise
+            sleep(0.5)
+
+
+def stop_postgres_container(container: str) -> None:
+    """Stop a container started by start_postgres_container; it removes itself"""
+    subprocess.run(["docker", "stop", container], check=False, capture_output=True)
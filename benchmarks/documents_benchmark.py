@@ -0,0 +1,36 @@
+"""Compare query plans and latency of the movie list and search queries without and
+with the movie_documents indexes from migrations/005_movie_documents.sql
+
+Run from the repository root:
+
+    python -m benchmarks.documents_benchmark --movies 1000000
+"""
+
+from benchmarks.common import ROOT
+from benchmarks.index_benchmark import compare_indexes, parse_args
+from database import movies_by_country_query, movies_by_genre_query, movies_query
+
+MIGRATION = ROOT / "migrations" / "005_movie_documents.sql"
+
+
+def query_paths() -> dict[str, tuple[str, list]]:
+    """Get the queries that read movie_documents, by the API path that runs them"""
+    paths = {f"get_movies sorted by {sort_by}": movies_query(None, sort_by, "desc")
+             for sort_by in ("title", "release_date", "score", "genre")}
+    paths.update({
+        "get_movies search": movies_query("movie 12345"),
+        "get_movies search sorted by title": movies_query("movie 12345", "title"),
+        "get_movies_by_genre": movies_by_genre_query(3),
+        "get_movie_by_country": movies_by_country_query("AC", "title"),
+    })
+    return paths
+
+
+def main() -> None:
+    """Run the benchmark"""
+    compare_indexes(MIGRATION, query_paths,
+                    parse_args(__doc__.splitlines()[0], "documents_benchmark.json"))
+
+
+if __name__ == "__main__":
+    main()
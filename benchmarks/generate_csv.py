@@ -0,0 +1,116 @@
+"""Generate a synthetic catalogue in the imdb_movies.csv format at any scale
+
+Rows are written to disk as they are generated, so memory use stays flat however
+large the file. Run from the repository root:
+
+    python -m benchmarks.generate_csv --movies 1000000 --output movies_1m.csv
+    python import_movie.py movies_1m.csv --stream
+"""
+
+import csv
+from argparse import ArgumentParser
+from datetime import date, timedelta
+from io import StringIO
+from multiprocessing import Pool
+from os import cpu_count
+from random import Random
+from time import perf_counter
+from typing import Iterator
+
+from import_movie import CSV_COLUMNS
+
+WORDS = ["Last", "Dark", "Night", "City", "Love", "War", "Secret", "Road", "Dream", "House",
+         "Shadow", "Blood", "King", "Girl", "Return", "Summer", "Storm", "Island", "Ghost",
+         "Heart", "Fire", "River", "Star", "Silent", "Wild", "Golden", "Lost", "Broken",
+         "Midnight", "Winter", "Empire", "Escape", "Journey", "Legend", "Hunter", "Angel"]
+GENRES = ["Drama", "Comedy", "Action", "Thriller", "Adventure", "Horror", "Romance",
+          "Animation", "Crime", "Science Fiction", "Fantasy", "Family", "Mystery",
+          "Documentary", "History", "War", "Music", "Western", "TV Movie"]
+STATUSES = ["Released", "Released", "Released", "Released", "Post Production", "In Production"]
+FIRST_DATE = date(1903, 1, 1)
+DAYS = (date(2030, 12, 31) - FIRST_DATE).days
+DATES = [(FIRST_DATE + timedelta(days=day)).strftime("%m/%d/%Y") for day in range(DAYS)]
+
+
+def generate_rows(first: int, last: int, movies: int, seed: int = 42,
+                  actors: int | None = None, languages: int = 60,
+                  countries: int = 150) -> Iterator[list[str]]:
+    """Yield the CSV rows of movies first to last - 1 in CSV_COLUMNS order.
+
+    Like the real catalogue, a few countries, languages and genres cover most movies
+    and a small share of actors appear in many of them while most appear once or twice.
+    Every range is seeded on its own so the output does not depend on how it is split."""
+    random = Random(seed * 1000003 + first).random
+    actors = actors or max(movies * 2, 10)
+    country_codes = [chr(65 + i // 26) + chr(65 + i % 26) for i in range(countries)]
+    language_names = [f" Language {i}" for i in range(1, languages + 1)]
+    statuses = [f" {status}" for status in STATUSES]
+
+    for number in range(first, last):
+        title = " ".join(WORDS[int(len(WORDS) * random())]
+                         for _ in range(1 + int(4 * random() ** 2))) + f" {number}"
+        crew = ", ".join(f"Actor {int(actors * random() ** 3) + 1}, "
+                         f"Role {int(actors * random() ** 1.5) + 1}"
+                         for _ in range(1 + int(12 * random() ** 0.7)))
+        genres = {GENRES[int(len(GENRES) * random() ** 2)]
+                  for _ in range(1 + int(3 * random() ** 1.5))}
+
+        yield [title,
+               DATES[DAYS - 1 - int(DAYS * random() ** 2)],
+               str(int(101 * random())),
+               ",\xa0".join(sorted(genres)),
+               f"The story of {title.lower()}, told over {80 + int(120 * random())} minutes.",
+               crew,
+               title,
+               statuses[int(len(statuses) * random())],
+               language_names[int(languages * random() ** 4)],
+               f"{int(300 * random()) * 1000000.0}",
+               f"{random() * 1000000000:.1f}",
+               country_codes[int(countries * random() ** 4)]]
+
+
+def generate_chunk(args: tuple) -> str:
+    """Render the rows of one range of movies as CSV text"""
+    buffer = StringIO()
+    csv.writer(buffer).writerows(generate_rows(*args))
+    return buffer.getvalue()
+
+
+def write_csv(path: str, movies: int, seed: int = 42, actors: int | None = None,
+              workers: int = 1, chunk_size: int = 20000) -> int:
+    """Write movies under the imdb_movies.csv header, generating ranges of them on
+    workers processes, and return how many were written"""
+    ranges = [(first, min(first + chunk_size, movies + 1), movies, seed, actors)
+              for first in range(1, movies + 1, chunk_size)]
+
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+        csv.writer(f).writerow(CSV_COLUMNS)
+        if workers > 1:
+            with Pool(workers) as pool:
+                for text in pool.imap(generate_chunk, ranges):
+                    f.write(text)
+        else:
+            for text in map(generate_chunk, ranges):
+                f.write(text)
+    return movies
+
+
+def main() -> None:
+    """Generate the file"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=1000000)
+    parser.add_argument("--actors", type=int, help="distinct actors (default: 2 per movie)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    parser.add_argument("--output", default="synthetic_movies.csv")
+    args = parser.parse_args()
+
+    started = perf_counter()
+    written = write_csv(args.output, args.movies, args.seed, args.actors, args.workers)
+    elapsed = perf_counter() - started
+    print(f"Wrote {written} movies to {args.output} in {elapsed:.1f}s "
+          f"({written / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Concurrent HTTP load generation for the API benchmarks"""
+
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from os import environ
+from threading import local
+from time import perf_counter, sleep
+from typing import Callable
+
+import requests
+
+from benchmarks.common import ROOT, summarise
+
+_sessions = local()
+
+
+def server_environment(settings: dict) -> dict:
+    """Get the environment that points a server at the benchmark database"""
+    return {**environ,
+            "DATABASE_USERNAME": settings["user"] or "",
+            "DATABASE_PASSWORD": settings["password"] or "",
+            "DATABASE_IP": settings["host"] or "",
+            "DATABASE_PORT": str(settings["port"] or ""),
+            "DATABASE_NAME": settings["database"]}
+
+
+def start_server(command: list[str], url: str, env: dict, timeout: float = 30) -> subprocess.Popen:
+    """Start a server process and wait until it answers"""
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = perf_counter() + timeout
+    while perf_counter() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return process
+        except requests.ConnectionError:
+            sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError(f"{' '.join(command)} did not start")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    """Stop a server process"""
+    process.terminate()
+    process.wait(timeout=30)
+
+
+def python_command(*args: str) -> list[str]:
+    """Build a command that runs with the current interpreter"""
+    return [sys.executable, *args]
+
+
+def get(path: str) -> Callable[[int], tuple]:
+    """Describe a GET request of the same path every time"""
+    return lambda _: ("GET", path, None)
+
+
+def _send(base_url: str, request: tuple) -> tuple[float, int]:
+    """Send a (method, path, json) request on this thread's session
+    and return latency and status"""
+    if not hasattr(_sessions, "session"):
+        _sessions.session = requests.Session()
+
+    method, path, body = request
+    started = perf_counter()
+    status = _sessions.session.request(method, base_url + path, json=body,
+                                       timeout=60).status_code
+    return (perf_counter() - started) * 1000, status
+
+
+def load_route(base_url: str, route: Callable[[int], tuple],
+               concurrency: int, duration: float) -> dict:
+    """Send the requests described by route(n) from concurrency threads for duration
+    seconds and return latency percentiles and requests per second"""
+    counter = count()
+
+    def worker() -> list[tuple[float, int]]:
+        results = []
+        deadline = perf_counter() + duration
+        while perf_counter() < deadline:
+            try:
+                results.append(_send(base_url, route(next(counter))))
+            except requests.RequestException:
+                results.append((0.0, 0))
+        return results
+
+    started = perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        futures = [executor.submit(worker) for _ in range(concurrency)]
+        results = [result for future in futures for result in future.result()]
+    elapsed = perf_counter() - started
+
+    ok = [latency for latency, status in results if 200 <= status < 400]
+    return {"requests": len(results),
+            "errors": len(results) - len(ok),
+            "requests_per_second": round(len(results) / elapsed, 1),
+            "latency_ms": summarise(ok) if ok else None}
+
+
+def load_routes(base_url: str, routes: dict[str, Callable[[int], tuple]],
+                concurrency: int, duration: float) -> dict:
+    """Run load_route for every named route of a server"""
+    results = {}
+    for name, route in routes.items():
+        results[name] = load_route(base_url, route, concurrency, duration)
+        print(f"{name}: {results[name]['requests_per_second']} req/s, "
+              f"p50 {(results[name]['latency_ms'] or {}).get('p50')} ms, "
+              f"p99 {(results[name]['latency_ms'] or {}).get('p99')} ms, "
+              f"{results[name]['errors']} errors")
+    return results
@@ -0,0 +1,129 @@
+"""Compare query plans and latency before and after migrations/002_query_indexes.sql
+
+Run from the repository root:
+
+    python -m benchmarks.index_benchmark --movies 1000000
+"""
+
+import re
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Callable
+
+from psycopg2.extensions import connection
+
+from benchmarks.common import (
+    ROOT,
+    apply_schema,
+    benchmark_settings,
+    create_database,
+    get_benchmark_connection,
+    run_sql_file,
+    save_results,
+    seed_movies,
+    summarise,
+    time_calls
+)
+from database import build_movies_query, movies_by_country_query, movies_by_genre_query
+
+MIGRATION = ROOT / "migrations" / "002_query_indexes.sql"
+
+
+def query_paths() -> dict[str, tuple[str, list]]:
+    """Get the queries the API and the reports run, by name"""
+    paths = {
+        "get_movies sorted by release_date": build_movies_query(
+            "TRUE", (), sort_by="release_date", sort_order="desc"),
+        "get_movies sorted by score": build_movies_query(
+            "TRUE", (), sort_by="score", sort_order="desc"),
+        "get_movies_by_genre": movies_by_genre_query(3),
+        "get_movie_by_country": movies_by_country_query("AC", "title"),
+        "search_actor": ("""SELECT actor, title FROM actors
+                         JOIN crew_assignment USING(actor_id)
+                         JOIN movies USING(movie_id)
+                         WHERE actor ILIKE %s
+                         ORDER BY SIMILARITY(actor, %s) DESC, actor, title""",
+                         ["%Actor 12345%", "Actor 12345"]),
+    }
+
+    reports = (ROOT / "queries.sql").read_text(encoding="utf-8").split(";")
+    for number, report in enumerate(reports, start=1):
+        if "SELECT" in report:
+            paths[f"queries.sql report {number}"] = (report, [])
+    return paths
+
+
+def index_names(migration: Path = MIGRATION) -> list[str]:
+    """Get the names of the indexes a migration creates"""
+    return re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)", migration.read_text(encoding="utf-8"))
+
+
+def measure(conn: connection, paths: dict[str, tuple[str, list]], repeat: int) -> dict:
+    """Capture the plan and latency of every query path"""
+    results = {}
+    with conn.cursor() as cur:
+        for name, (query, params) in paths.items():
+            cur.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}", params)
+            plan = cur.fetchone()[0][0]
+
+            def run(query=query, params=params):
+                cur.execute(query, params)
+                cur.fetchall()
+
+            results[name] = {"plan": plan["Plan"]["Node Type"],
+                             "scans": sorted(set(re.findall(r"'Node Type': '([^']*Scan)'",
+                                                            str(plan)))),
+                             "execution_ms": plan["Execution Time"],
+                             "latency_ms": summarise(time_calls(run, repeat))}
+    conn.rollback()
+    return results
+
+
+def parse_args(description: str, output: str) -> Namespace:
+    """Parse the options of an index benchmark"""
+    parser = ArgumentParser(description=description)
+    parser.add_argument("--movies", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default=output)
+    return parser.parse_args()
+
+
+def compare_indexes(migration: Path, paths: Callable[[], dict], args: Namespace) -> None:
+    """Measure the query paths without and then with the indexes a migration creates,
+    printing the scans and latency of each and saving the results"""
+    settings = benchmark_settings()
+    create_database(settings)
+    conn = get_benchmark_connection(settings)
+    apply_schema(conn)
+
+    with conn.cursor() as cur:
+        for index in index_names(migration):
+            cur.execute(f"DROP INDEX {index}")
+    conn.commit()
+
+    seed_movies(conn, args.movies)
+    before = measure(conn, paths(), args.repeat)
+
+    run_sql_file(conn, migration)
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.commit()
+    after = measure(conn, paths(), args.repeat)
+    conn.close()
+
+    for name, result in before.items():
+        print(f"{name}\n"
+              f"  before: {result['scans']} p50 {result['latency_ms']['p50']} ms\n"
+              f"  after:  {after[name]['scans']} p50 {after[name]['latency_ms']['p50']} ms")
+
+    save_results({"movies": args.movies, "before": before, "after": after}, args.output)
+
+
+def main() -> None:
+    """Run the benchmark"""
+    compare_indexes(MIGRATION, query_paths,
+                    parse_args(__doc__.splitlines()[0], "index_benchmark.json"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the Flask dev server, gunicorn and the async API under concurrent load
+
+Run from the repository root:
+
+    python -m benchmarks.load_test --movies 100000 --concurrency 200
+"""
+
+from argparse import ArgumentParser
+
+from benchmarks.common import (
+    apply_schema,
+    benchmark_settings,
+    create_database,
+    get_benchmark_connection,
+    save_results,
+    seed_movies
+)
+from benchmarks.http_load import (
+    get,
+    load_routes,
+    python_command,
+    server_environment,
+    start_server,
+    stop_server
+)
+
+PATHS = ["/movies?limit=50",
+         "/movies/1",
+         "/movies/1?expand=true",
+         "/genres",
+         "/genres/3/movies?sort_by=score&sort_order=desc",
+         "/countries/AC?sort_by=release_date",
+         "/actors?search=Actor%20123"]
+
+SERVERS = {
+    "flask": python_command("-m", "flask", "--app", "api", "run", "--port", "5101",
+                            "--with-threads", "--no-reload", "--no-debugger"),
+    "async": python_command("-m", "hypercorn", "async_api:app", "--bind", "127.0.0.1:5102"),
+    "gunicorn": python_command("-m", "gunicorn", "--config", "gunicorn.conf.py",
+                               "--bind", "127.0.0.1:5103", "api:app"),
+}
+URLS = {"flask": "http://127.0.0.1:5101",
+        "async": "http://127.0.0.1:5102",
+        "gunicorn": "http://127.0.0.1:5103"}
+
+
+def main() -> None:
+    """Run the load test"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--servers", nargs="+", choices=SERVERS, default=list(SERVERS))
+    parser.add_argument("--output", default="load_test.json")
+    args = parser.parse_args()
+
+    settings = benchmark_settings()
+    create_database(settings)
+    conn = get_benchmark_connection(settings)
+    apply_schema(conn)
+    seed_movies(conn, args.movies)
+    conn.close()
+
+    env = server_environment(settings)
+    results = {"movies": args.movies, "concurrency": args.concurrency, "servers": {}}
+    for name in args.servers:
+        process = start_server(SERVERS[name], URLS[name], env)
+        try:
+            results["servers"][name] = load_routes(URLS[name],
+                                                   {path: get(path) for path in PATHS},
+                                                   args.concurrency, args.duration)
+        finally:
+            stop_server(process)
+
+    save_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
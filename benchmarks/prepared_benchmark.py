@@ -0,0 +1,106 @@
+"""Compare planning time and latency of the hot read queries with and without
+prepared statements
+
+Run from the repository root:
+
+    python -m benchmarks.prepared_benchmark --movies 100000
+"""
+
+from argparse import ArgumentParser
+from itertools import count
+
+from psycopg2 import connect
+
+from benchmarks.common import (
+    apply_schema,
+    benchmark_settings,
+    create_database,
+    get_benchmark_connection,
+    save_results,
+    seed_movies,
+    summarise,
+    time_calls
+)
+from database import GENRE_QUERY, MOVIE_QUERY, movies_by_country_query, movies_by_genre_query
+from prepared_statements import PreparedConnection, execute_prepared, registry
+
+
+def query_paths() -> dict:
+    """Get the statements to compare by the database.py function that runs them, each
+    with a function giving the parameters of its nth call"""
+    by_genre, _ = movies_by_genre_query(1)
+    by_country, _ = movies_by_country_query("AA", "title")
+    return {"get_movie_by_id": (MOVIE_QUERY, lambda n: (1 + n % 1000,)),
+            "get_genre": (GENRE_QUERY, lambda n: (1 + n % 20,)),
+            "get_movies_by_genre": (by_genre, lambda n: [1 + n % 20, 101]),
+            "get_movie_by_country": (by_country, lambda n: ["AA" if n % 2 else "AB", 101])}
+
+
+def planning_ms(cur, query: str) -> float:
+    """Get the planning time Postgres reports for a statement"""
+    cur.execute(f"EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) {query}")
+    return cur.fetchone()[0][0]["Planning Time"]
+
+
+def measure(conn, repeat: int) -> dict:
+    """Time every query path as plain text and as a prepared statement"""
+    results = {}
+    with conn.cursor() as cur:
+        for name, (query, params) in query_paths().items():
+            plain, prepared = count(), count()
+
+            def run_plain(query=query, params=params, calls=plain):
+                cur.execute(query, params(next(calls)))
+                cur.fetchall()
+
+            def run_prepared(query=query, params=params, calls=prepared):
+                execute_prepared(cur, query, params(next(calls)))
+                cur.fetchall()
+
+            plain_latency = summarise(time_calls(run_plain, repeat))
+            prepared_latency = summarise(time_calls(run_prepared, repeat))
+
+            statement, _, parameters = registry.get(query)
+            literal = cur.mogrify(query, params(0)).decode()
+            execute = cur.mogrify(f"EXECUTE {statement} ({', '.join(['%s'] * parameters)})",
+                                  params(0)).decode()
+            results[name] = {"plain": {"planning_ms": planning_ms(cur, literal),
+                                       "latency_ms": plain_latency},
+                             "prepared": {"planning_ms": planning_ms(cur, execute),
+                                          "latency_ms": prepared_latency}}
+    conn.rollback()
+    return results
+
+
+def main() -> None:
+    """Run the benchmark"""
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--movies", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--output", default="prepared_benchmark.json")
+    args = parser.parse_args()
+
+    settings = benchmark_settings()
+    create_database(settings)
+    conn = get_benchmark_connection(settings)
+    apply_schema(conn)
+    seed_movies(conn, args.movies)
+    conn.close()
+
+    conn = connect(**settings, connection_factory=PreparedConnection)
+    results = measure(conn, args.repeat)
+    conn.close()
+
+    for name, result in results.items():
+        plain, prepared = result["plain"], result["prepared"]
+        print(f"{name}\n"
+              f"  plain:    planning {plain['planning_ms']} ms, "
+              f"p50 {plain['latency_ms']['p50']} ms\n"
+              f"  prepared: planning {prepared['planning_ms']} ms, "
+              f"p50 {prepared['latency_ms']['p50']} ms")
+
+    save_results({"movies": args.movies, "repeat": args.repeat, **results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Process-wide pool of database connections shared by the API and the importer"""
+
+from contextlib import contextmanager
+from os import environ
+from threading import Condition, Lock
+from time import monotonic
+from typing import Callable, Iterator
+
+from dotenv import load_dotenv
+from psycopg2 import connect, Error
+from psycopg2.extensions import connection, TRANSACTION_STATUS_IDLE
+
+from metrics import TimedCursor
+from prepared_statements import PreparedConnection
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free before the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to max_size and kept open between checkouts.
+    A connection that has been idle for longer than check_after seconds is pinged
+    before it is handed out, and replaced if the ping fails."""
+
+    def __init__(self, dsn: dict, min_size: int = 1, max_size: int = 10,
+                 timeout: float = 5.0, check_after: float = 30.0) -> None:
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size")
+
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+
+        self._idle: list[tuple[connection, float]] = []
+        self._size = 0
+        self._closed = False
+        self._cond = Condition()
+        self._counters = {"checkouts": 0,
+                          "timeouts": 0,
+                          "created": 0,
+                          "discarded": 0,
+                          "failed_checks": 0,
+                          "wait_seconds": 0.0}
+
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._connect(), monotonic()))
+
+    def _connect(self) -> connection:
+        """Open a new connection"""
+        conn = connect(**self.dsn)
+        with self._cond:
+            self._counters["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn: connection, idle_since: float) -> bool:
+        """Check a connection is still usable before handing it out"""
+        if conn.closed:
+            return False
+
+        if monotonic() - idle_since < self.check_after:
+            return True
+
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.autocommit = False
+        except Error:
+            return False
+        return True
+
+    def _discard(self, conn: connection, failed_check: bool = False) -> None:
+        """Close a connection and free its slot, counting a failed health check
+        together with the discard"""
+        try:
+            conn.close()
+        except Error:
+            pass
+
+        with self._cond:
+            self._size -= 1
+            self._counters["discarded"] += 1
+            if failed_check:
+                self._counters["failed_checks"] += 1
+            self._cond.notify()
+
+    def getconn(self) -> connection:
+        """Borrow a connection, waiting up to the checkout timeout"""
+        started = monotonic()
+        deadline = started + self.timeout
+
+        while True:
+            conn, idle_since = None, 0.0
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        self._counters["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available after {self.timeout} seconds")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Error:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn, failed_check=True)
+                continue
+
+            with self._cond:
+                self._counters["checkouts"] += 1
+                self._counters["wait_seconds"] += monotonic() - started
+            return conn
+
+    def putconn(self, conn: connection, discard: bool = False) -> None:
+        """Return a borrowed connection to the pool"""
+        if discard or self._closed or conn.closed:
+            self._discard(conn)
+            return
+
+        try:
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Error:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._idle.append((conn, monotonic()))
+            self._cond.notify()
+
+    def close(self) -> None:
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        """Return pool usage counters for monitoring"""
+        with self._cond:
+            return {"min_size": self.min_size,
+                    "max_size": self.max_size,
+                    "size": self._size,
+                    "idle": len(self._idle),
+                    "in_use": self._size - len(self._idle),
+                    **self._counters}
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = Lock()
+_commit_listeners: list[Callable[[connection], None]] = []
+_rollback_listeners: list[Callable[[connection], None]] = []
+
+
+def on_commit(listener: Callable[[connection], None]) -> None:
+    """Register a callback to run with the connection whenever a pooled transaction
+    has committed"""
+    _commit_listeners.append(listener)
+
+
+def on_rollback(listener: Callable[[connection], None]) -> None:
+    """Register a callback to run with the connection whenever a pooled transaction
+    is rolled back"""
+    _rollback_listeners.append(listener)
+
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide pool, creating it from the environment on first use"""
+    global _pool  # pylint: disable=global-statement
+
+    with _pool_lock:
+        if _pool is None:
+            load_dotenv()
+            _pool = ConnectionPool(
+                {"user": environ["DATABASE_USERNAME"],
+                 "password": environ["DATABASE_PASSWORD"],
+                 "host": environ["DATABASE_IP"],
+                 "port": environ["DATABASE_PORT"],
+                 "database": environ["DATABASE_NAME"],
+                 "connection_factory": PreparedConnection,
+                 "cursor_factory": TimedCursor},
+                min_size=int(environ.get("DATABASE_POOL_MIN_SIZE", 1)),
+                max_size=int(environ.get("DATABASE_POOL_MAX_SIZE", 10)),
+                timeout=float(environ.get("DATABASE_POOL_TIMEOUT", 5)),
+                check_after=float(environ.get("DATABASE_POOL_CHECK_AFTER", 30)))
+        return _pool
+
+
+def reset_pool(close: bool = True) -> None:
+    """Drop the process-wide pool so the next checkout opens a fresh one.
+
+    A forked child should pass close=False: closing the connections it inherited
+    would end the parent's sessions, which share the same sockets."""
+    global _pool  # pylint: disable=global-statement
+
+    with _pool_lock:
+        if _pool is not None and close:
+            _pool.close()
+        _pool = None
+
+
+@contextmanager
+def get_connection() -> Iterator[connection]:
+    """Borrow a pooled connection for one transaction.
+
+    Commits when the block exits normally and rolls back if it raises, including
+    when a generator holding the connection is closed early. The connection always
+    goes back to the pool."""
+    pool = get_pool()
+    conn = pool.getconn()
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        for listener in _rollback_listeners:
+            listener(conn)
+        try:
+            conn.rollback()
+        except Error:
+            discard = True
+            raise
+        raise
+    else:
+        for listener in _commit_listeners:
+            listener(conn)
+    finally:
+        pool.putconn(conn, discard=discard)
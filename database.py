@@ -1,230 +1,684 @@
 """Database for Movie API"""
 
+from datetime import date, datetime
 from os import environ
-from datetime import date
+from typing import Iterator
 
-from psycopg2 import connect
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import execute_values
 from psycopg2.extensions import connection, cursor
-from dotenv import load_dotenv
 
-from import_movie import import_movies_to_database, get_id
-
-
-def get_connection() -> connection:
-    """Get Connection"""
-    load_dotenv()
-    return connect(
-        user=environ["DATABASE_USERNAME"],
-        password=environ["DATABASE_PASSWORD"],
-        host=environ["DATABASE_IP"],
-        port=environ["DATABASE_PORT"],
-        database=environ["DATABASE_NAME"]
-    )
-
-
-def get_cursor(conn: connection) -> cursor:
-    """Get Cursor"""
-    return conn.cursor(cursor_factory=RealDictCursor)
+from connection_pool import get_connection, get_pool
+from dimension_cache import get_cache_stats, resolve_id, resolve_ids
+from metrics import TimedCursor, TimedDictCursor
+from movie_documents import refresh_documents
+from prepared_statements import execute_prepared
+import slow_query_log
+from table_versions import MOVIE_TABLES, bump_versions, get_versions
+from ttl_cache import ttl_cache
+
+REFERENCE_CACHE_TTL = float(environ.get("REFERENCE_CACHE_TTL", 300))
+
+if environ.get("SLOW_QUERY_MS"):
+    slow_query_log.enable(float(environ["SLOW_QUERY_MS"]),
+                          explain=environ.get("SLOW_QUERY_EXPLAIN", "1") == "1")
+
+
+def get_cursor(conn: connection, compact: bool = False) -> cursor:
+    """Get a dict cursor, or a tuple cursor when compact, that records the time
+    and rows of every statement"""
+    return conn.cursor(cursor_factory=TimedCursor if compact else TimedDictCursor)
+
+
+class CompactRows:
+    """Rows as tuples sharing one list of column names, instead of a dict per row
+    repeating every name"""
+
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns: list[str], rows: list[tuple]) -> None:
+        self.columns = columns
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def to_json(self) -> dict:
+        """Get the columnar JSON shape: {"columns": [...], "rows": [[...], ...]}"""
+        return {"columns": self.columns, "rows": self.rows}
+
+
+MOVIE_FIELDS = ("movie_id", "title", "release_date", "score", "overview", "orig_title",
+                "status", "language_id", "budget", "revenue", "country_id")
+
+SORT_KEYS = {"title": "m.title",
+             "release_date": "m.release_date",
+             "genre": "m.genre_sort",
+             "revenue": "m.revenue",
+             "budget": "m.budget",
+             "score": "m.score"}
+
+MOVIE_QUERY = f"""SELECT {", ".join(MOVIE_FIELDS)} FROM movies
+              WHERE movie_id = %s"""
+
+MOVIE_DETAILS_QUERY = f"""SELECT {", ".join(f"m.{field}" for field in MOVIE_FIELDS)},
+                          m.language, m.country, m.genres, m.crew
+                      FROM movie_documents m
+                      WHERE m.movie_id = ANY(%s::INT[])
+                      ORDER BY ARRAY_POSITION(%s::INT[], m.movie_id)"""
+
+GENRE_QUERY = """SELECT genre FROM genres
+              WHERE genre_id = %s"""
+
+SEARCH_ACTOR_QUERY = """SELECT actor, title FROM actors
+                     JOIN crew_assignment USING(actor_id)
+                     JOIN movies USING(movie_id)
+                     WHERE actor ILIKE %s
+                     ORDER BY SIMILARITY(actor, %s) DESC, actor, title"""
+
+
+def build_movies_query(where: str, params: tuple, fields: list[str] | None = None,
+                       sort_by: str | None = None, sort_order: str = "asc",
+                       after: list | None = None, limit: int | None = 100,
+                       joins: str = "", extra_columns: tuple = (),
+                       rank: tuple[str, tuple] | None = None,
+                       as_json: bool = False) -> tuple[str, list]:
+    """Build a keyset paginated query over the movie documents m.
+
+    Rows are ordered by the sort_by key and then movie_id, and after holds the
+    sort key and movie_id of the last row of the previous page. Without a sort_by,
+    rank is an optional (expression, params) pair to order by, most relevant first.
+    One row more than limit is selected so the caller can tell whether another page
+    follows; a limit of None selects every remaining row. With as_json, the page
+    is encoded by Postgres as json_page_query describes."""
+    columns = ["m.movie_id"] + [f"m.{field}" for field in fields or MOVIE_FIELDS
+                                if field != "movie_id"]
+    columns += list(extra_columns)
+    direction = "DESC" if sort_order == "desc" else "ASC"
+
+    sort_key, sort_params = None, ()
+    if sort_by:
+        sort_key = SORT_KEYS[sort_by]
+    elif rank:
+        (sort_key, sort_params), direction = rank, "DESC"
+
+    keys, order = ["m.movie_id"], ["m.movie_id"]
+    select_params = []
+    if sort_key:
+        columns.append(f"{sort_key} AS sort_key")
+        select_params += sort_params
+        keys.insert(0, sort_key)
+        order.insert(0, "sort_key")
+
+    query_params = select_params + list(params)
+    if after:
+        where += f""" AND ({", ".join(keys)}) {"<" if direction == "DESC" else ">"}
+                    ({", ".join(["%s"] * len(keys))})"""
+        query_params += list(sort_params) + after
+
+    query = f"""SELECT {", ".join(columns)}
+            FROM movie_documents m {joins}
+            WHERE {where}
+            ORDER BY {", ".join(f"{key} {direction}" for key in order)}"""
+    if limit is None:
+        return query, query_params
+    if as_json:
+        return json_page_query(query, columns, order, direction), \
+            query_params + [limit + 1, limit]
+    return query + " LIMIT %s", query_params + [limit + 1]
+
+
+def json_page_query(query: str, columns: list[str], order: list[str], direction: str) -> str:
+    """Wrap a query from build_movies_query so Postgres encodes the page as a JSON array
+    of objects with sorted keys and HTTP dates, as the Flask JSON provider would.
+
+    The query returns one row: the array as text (NULL for an empty page) and the
+    keyset of its last row when another page follows, so no per-row Python objects
+    are created. Its parameters are the query's, the limit plus one and the limit."""
+    names = sorted(column.rsplit(".", 1)[-1] for column in columns
+                   if not column.endswith(" AS sort_key"))
+    values = [f"""TO_CHAR(page.{name}, 'Dy, DD Mon YYYY "00:00:00 GMT"')"""
+              if name == "release_date" else f"page.{name}" for name in names]
+    document = ", ".join(f"'{name}', {value}" for name, value in zip(names, values))
+
+    keys = [f"page.{key.rsplit('.', 1)[-1]}" for key in order]
+    reverse = "ASC" if direction == "DESC" else "DESC"
+    return f"""WITH page AS ({query} LIMIT %s),
+            shown AS (SELECT * FROM page
+                      ORDER BY {", ".join(f"{key} {direction}" for key in keys)}
+                      LIMIT %s)
+            SELECT (SELECT JSON_AGG(JSON_BUILD_OBJECT({document})
+                                    ORDER BY {", ".join(f"{key} {direction}" for key in keys)})
+                    FROM shown page)::TEXT AS movies,
+                CASE WHEN (SELECT COUNT(*) FROM page) > (SELECT COUNT(*) FROM shown)
+                    THEN (SELECT JSON_BUILD_ARRAY({", ".join(keys)}) FROM shown page
+                          ORDER BY {", ".join(f"{key} {reverse}" for key in keys)}
+                          LIMIT 1)
+                END AS next_after"""
+
+
+def split_page(rows: list[dict], limit: int) -> tuple[list[dict], list | None]:
+    """Trim the extra row selected by build_movies_query and return the page of rows
+    along with the keyset values to fetch the next page from, if there is one"""
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_after = [last["sort_key"], last["movie_id"]] if "sort_key" in last \
+            else [last["movie_id"]]
+
+    for row in rows:
+        row.pop("sort_key", None)
+    return rows, next_after
+
+
+def fetch_movie_page(cur, query: str, params: list, limit: int) -> tuple[list[dict], list | None]:
+    """Run a query from build_movies_query and return a page as split_page does"""
+    execute_prepared(cur, query, params)
+    return split_page(cur.fetchall(), limit)
+
+
+def fetch_compact_page(cur, query: str, params: list,
+                       limit: int) -> tuple[CompactRows, list | None]:
+    """Run a query from build_movies_query on a compact cursor and return the page as
+    CompactRows along with the keyset to fetch the next page from, if there is one"""
+    execute_prepared(cur, query, params)
+    rows = cur.fetchall()
+    columns = [column.name for column in cur.description]
+
+    next_after = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_after = [last[-1], last[0]] if columns[-1] == "sort_key" else [last[0]]
+
+    if columns[-1] == "sort_key":
+        columns, rows = columns[:-1], [row[:-1] for row in rows]
+    return CompactRows(columns, rows), next_after
+
+
+def fetch_movie_page_json(cur, query: str, params: list) -> tuple[str | None, list | None]:
+    """Run a query from build_movies_query(as_json=True) and return the page as
+    JSON text, or None if it is empty, and the keyset to fetch the next page from"""
+    execute_prepared(cur, query, params)
+    row = cur.fetchone()
+    return row["movies"], row["next_after"]
+
+
+def iter_movie_rows(query: str, params: list, itersize: int = 2000,
+                    compact: bool = False) -> Iterator[dict | list | tuple]:
+    """Yield the rows of a query from a server-side cursor, fetching itersize rows
+    per round trip so memory stays flat however many rows there are.
+
+    When compact, the first item is the list of column names and every row
+    after it is a tuple."""
+    with get_connection() as conn, \
+            conn.cursor(name="movie_stream",
+                        cursor_factory=TimedCursor if compact else TimedDictCursor) as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+
+        if not compact:
+            for row in cur:
+                row.pop("sort_key", None)
+                yield row
+            return
+
+        # A named cursor only describes its columns once the first rows are fetched
+        rows = cur.fetchmany(itersize)
+        columns = [column.name for column in cur.description]
+        if columns[-1] != "sort_key":
+            yield columns
+            yield from rows
+            yield from cur
+            return
+
+        yield columns[:-1]
+        while rows:
+            for row in rows:
+                yield row[:-1]
+            rows = cur.fetchmany(itersize)
+
+
+def movies_query(search: str | None,
+                 sort_by: str | None = None,
+                 sort_order: str | None = None,
+                 after: list | None = None,
+                 limit: int | None = 100,
+                 fields: list[str] | None = None,
+                 as_json: bool = False) -> tuple[str, list]:
+    """Build the query for movies.
+
+    A search matches the full text of the title, original title and overview, or
+    any part of the title regardless of case, and ranks the best matches first
+    unless a sort_by is given."""
+    where, params, rank = "TRUE", (), None
+    if search:
+        where = """(m.search_document @@ WEBSEARCH_TO_TSQUERY('english', %s)
+                OR m.title ILIKE %s)"""
+        params = (search, f"%{search}%")
+        rank = ("""(TS_RANK(m.search_document, WEBSEARCH_TO_TSQUERY('english', %s))
+                + SIMILARITY(m.title, %s))::FLOAT8""", (search, search))
+
+    return build_movies_query(where, params, fields, sort_by, sort_order,
+                              after, limit, rank=rank, as_json=as_json)
 
 
 def get_movies(search: str | None,
                sort_by: str | None = None,
-               sort_order: str | None = None) -> list[dict] | list:
-    """Get movies and returns list of movies"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-
-        query = "SELECT * FROM movies "
-        if search:
-            query += "WHERE title LIKE %s "
-            if sort_by:
-                query += f"ORDER BY {sort_by} {sort_order}"
+               sort_order: str | None = None,
+               after: list | None = None,
+               limit: int = 100,
+               fields: list[str] | None = None,
+               as_json: bool = False,
+               compact: bool = False) -> tuple[list[dict] | CompactRows | str | None,
+                                               list | None]:
+    """Get a page of movies and the keyset to fetch the next page from.
+    With as_json the page is JSON text encoded by Postgres, or None if empty;
+    with compact it is CompactRows."""
+    query, query_params = movies_query(search, sort_by, sort_order, after, limit, fields,
+                                       as_json)
+    with get_connection() as conn, get_cursor(conn, compact) as cur:
+        if as_json:
+            return fetch_movie_page_json(cur, query, query_params)
+        if compact:
+            return fetch_compact_page(cur, query, query_params, limit)
+        return fetch_movie_page(cur, query, query_params, limit)
 
-        cur.execute(query, (f"%{search}%",))
 
-        data = cur.fetchall()
-        conn.commit()
+def get_movie_by_id(movie_id: int) -> tuple | None:
+    """Get movie by ID"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        execute_prepared(cur, MOVIE_QUERY, (movie_id,))
 
+        data = cur.fetchone()
     return data
 
 
-def get_movie_by_id(movie_id: int) -> tuple | None:
-    """Get movie by ID"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        cur.execute("""SELECT * FROM movies
-                        WHERE movie_id = %s""", (movie_id,))
+def get_movie_details(movie_ids: list[int]) -> list[dict]:
+    """Get movies with their language, country, genres and crew in one query,
+    in the order of movie_ids"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        cur.execute(MOVIE_DETAILS_QUERY, (movie_ids, movie_ids))
 
-        data = cur.fetchone()
-        conn.commit()
+        data = cur.fetchall()
     return data
 
 
-def create_movie(title: str, release_date: date, genre: str, actors: list[str], overview: str,
-                 status: str, budget: int, revenue: int, country: str, language: str) -> dict:
-    """Create movie"""
-    data = import_movies_to_database([{"title": title,
-                                       "release_date": release_date,
-                                       "score": 10,
-                                       "genre": genre,
-                                       "overview": overview,
-                                       "crew": actors,
-                                       "orig_title": "jhj",
-                                       "status": status,
-                                       "language": language,
-                                       "budget": budget,
-                                       "revenue": revenue,
-                                       "country": country}])
-    return data[-1]
-
-
-def update_movie(title: str, release_date: date, genre: str, actors: list[str],
-                 overview: str, status: str, budget: int, revenue: int,
-                 country: str, language: str, movie_id: int) -> list[tuple]:
-    """Update movie"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        language_id = get_id(
-            cur, language, "languages", "language", "language_id")
-
-        country_id = get_id(
-            cur, country, "countries", "country", "country_id")
+def update_movie(title: str | None, release_date: date | None, genre: str | None,
+                 actors: list[str] | None, overview: str | None, status: str | None,
+                 budget: int | None, revenue: int | None, country: str | None,
+                 language: str | None, movie_id: int) -> dict | None:
+    """Update the given fields of a movie in one statement and, when genre or actors
+    are given, replace its genres or crew with set-based inserts and deletes.
+    Everything runs in one transaction; returns None, changing nothing, if the movie
+    does not exist."""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        cur.execute("SELECT movie_id FROM movies WHERE movie_id = %s FOR UPDATE", (movie_id,))
+        if cur.fetchone() is None:
+            return None
 
         attributes = {"title": title,
                       "release_date": release_date,
                       "overview": overview,
                       "status": status,
-                      "language_id": language_id,
                       "budget": budget,
-                      "revenue": revenue,
-                      "country_id": country_id}
-
-        for word, attribute in attributes.items():
-            if attribute:
-                cur.execute(f"""UPDATE movies
-                            SET {word} = %s
-                            WHERE movie_id = %s; """,
-                            (attribute, movie_id))
-
-        genre_id = get_id(cur, genre, "genres", "genre", "genre_id")
-
-        cur.execute(
-            """UPDATE genre_assignment
-            SET genre_id = %s
-            WHERE movie_id = %s""", (genre_id, movie_id))
+                      "revenue": revenue}
+        if language is not None:
+            attributes["language_id"] = resolve_id(cur, "languages", language)
+        if country is not None:
+            attributes["country_id"] = resolve_id(cur, "countries", country)
+        attributes = {word: attribute for word, attribute in attributes.items()
+                      if attribute is not None}
+
+        if attributes:
+            cur.execute(f"""UPDATE movies
+                        SET {", ".join(f"{word} = %s" for word in attributes)}
+                        WHERE movie_id = %s
+                        RETURNING {", ".join(MOVIE_FIELDS)}""",
+                        (*attributes.values(), movie_id))
+        else:
+            execute_prepared(cur, MOVIE_QUERY, (movie_id,))
 
-        actor_ids = [get_id(cur, actor, "actors", "actor", "actor_id")
-                     for actor in actors[::2]]
+        data = cur.fetchone()
+        if data is None:
+            return None
+
+        if genre is not None:
+            genres = genre.split(",")
+            genre_ids = resolve_ids(cur, "genres", genres)
+            replace_genre_assignments(
+                cur, movie_id, [genre_ids[name.strip()] for name in genres])
+
+        if actors is not None:
+            names = resolve_ids(cur, "actors", actors[::2])
+            roles = resolve_ids(cur, "roles", actors[1::2])
+            replace_crew_assignments(
+                cur, movie_id,
+                [names[actor.strip()] for actor in actors[::2]],
+                [roles[role.strip()] for role in actors[1::2]])
+
+        changed = ["movies"]
+        if language is not None:
+            changed.append("languages")
+        if country is not None:
+            changed.append("countries")
+        if genre is not None:
+            changed += ["genre_assignment", "genres"]
+        if actors is not None:
+            changed += ["crew_assignment", "actors", "roles"]
+        refresh_documents(cur, [movie_id])
+        bump_versions(cur, changed)
+
+    invalidate_reference_caches()
+    return data
 
-        role_ids = [get_id(cur, role, "roles", "role", "role_id")
-                    for role in actors[1::2]]
 
-        for actor_id, role_id in zip(actor_ids, role_ids):
-            cur.execute(
-                """UPDATE crew_assignment
-                SET actor_id = %s, role_id = %s
-                WHERE movie_id = %s""",
-                (actor_id, role_id, movie_id))
-
-        cur.execute(
-            """SELECT * FROM movies
-            WHERE movie_id = %s""", (movie_id,))
-
-        data = cur.fetchall()
-        conn.commit()
-    return data
+def replace_genre_assignments(cur, movie_id: int, genre_ids: list[int]) -> None:
+    """Make genre_ids the genres of a movie, keeping the assignments that stay"""
+    cur.execute("""DELETE FROM genre_assignment
+                WHERE movie_id = %s AND genre_id <> ALL(%s::INT[])""",
+                (movie_id, genre_ids))
+
+    cur.execute("""INSERT INTO genre_assignment (movie_id, genre_id)
+                SELECT DISTINCT %s, new.genre_id
+                FROM UNNEST(%s::INT[]) AS new(genre_id)
+                WHERE NOT EXISTS (SELECT 1 FROM genre_assignment ga
+                                  WHERE ga.movie_id = %s AND ga.genre_id = new.genre_id)""",
+                (movie_id, genre_ids, movie_id))
+
+
+def replace_crew_assignments(cur, movie_id: int, actor_ids: list[int],
+                             role_ids: list[int]) -> None:
+    """Make the zipped actor and role ids the crew of a movie,
+    keeping the assignments that stay"""
+    pairs = list(zip(actor_ids, role_ids))
+    actor_ids = [actor_id for actor_id, _ in pairs]
+    role_ids = [role_id for _, role_id in pairs]
+
+    cur.execute("""DELETE FROM crew_assignment
+                WHERE movie_id = %s
+                AND (actor_id, role_id) NOT IN (SELECT * FROM UNNEST(%s::INT[], %s::INT[]))""",
+                (movie_id, actor_ids, role_ids))
+
+    cur.execute("""INSERT INTO crew_assignment (movie_id, actor_id, role_id)
+                SELECT DISTINCT %s, new.actor_id, new.role_id
+                FROM UNNEST(%s::INT[], %s::INT[]) AS new(actor_id, role_id)
+                WHERE NOT EXISTS (SELECT 1 FROM crew_assignment ca
+                                  WHERE ca.movie_id = %s
+                                  AND ca.actor_id = new.actor_id
+                                  AND ca.role_id = new.role_id)""",
+                (movie_id, actor_ids, role_ids, movie_id))
+
+
+def upsert_movies(movies: list[dict]) -> list[dict]:
+    """Insert or update many movies by title in one transaction.
+
+    Each movie needs title, release_date, score, genre, overview, actors, orig_title,
+    status, budget, revenue, country and language; genres and crew of updated movies
+    are replaced. Returns movie_id, title and whether it was created, in input order."""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        languages = resolve_ids(cur, "languages", [movie["language"] for movie in movies])
+        countries = resolve_ids(cur, "countries", [movie["country"] for movie in movies])
+        genres = resolve_ids(cur, "genres", [genre for movie in movies
+                                             for genre in movie["genre"].split(",")])
+        actors = resolve_ids(cur, "actors", [actor for movie in movies
+                                             for actor in movie["actors"][::2]])
+        roles = resolve_ids(cur, "roles", [role for movie in movies
+                                           for role in movie["actors"][1::2]])
+
+        rows = execute_values(
+            cur, """INSERT INTO movies (title, release_date, score, overview, orig_title,
+                    status, language_id, budget, revenue, country_id)
+                VALUES %s
+                ON CONFLICT (title) DO UPDATE
+                SET release_date = EXCLUDED.release_date, score = EXCLUDED.score,
+                    overview = EXCLUDED.overview, orig_title = EXCLUDED.orig_title,
+                    status = EXCLUDED.status, language_id = EXCLUDED.language_id,
+                    budget = EXCLUDED.budget, revenue = EXCLUDED.revenue,
+                    country_id = EXCLUDED.country_id
+                RETURNING movie_id, title, xmax = 0 AS created""",
+            [(movie["title"], movie["release_date"], movie["score"], movie["overview"],
+              movie["orig_title"], movie["status"], languages[movie["language"].strip()],
+              movie["budget"], movie["revenue"], countries[movie["country"].strip()])
+             for movie in movies],
+            fetch=True)
+        saved = {row["title"]: row for row in rows}
+        movie_ids = [saved[movie["title"]]["movie_id"] for movie in movies]
+
+        cur.execute("DELETE FROM genre_assignment WHERE movie_id = ANY(%s::INT[])",
+                    (movie_ids,))
+        execute_values(cur, "INSERT INTO genre_assignment (movie_id, genre_id) VALUES %s",
+                       list(dict.fromkeys(
+                           (movie_id, genres[genre.strip()])
+                           for movie_id, movie in zip(movie_ids, movies)
+                           for genre in movie["genre"].split(","))))
+
+        cur.execute("DELETE FROM crew_assignment WHERE movie_id = ANY(%s::INT[])",
+                    (movie_ids,))
+        execute_values(cur, """INSERT INTO crew_assignment (movie_id, actor_id, role_id)
+                       VALUES %s""",
+                       [(movie_id, actors[actor.strip()], roles[role.strip()])
+                        for movie_id, movie in zip(movie_ids, movies)
+                        for actor, role in zip(movie["actors"][::2], movie["actors"][1::2])])
+        refresh_documents(cur, movie_ids)
+        bump_versions(cur, MOVIE_TABLES)
+
+    invalidate_reference_caches()
+    return [saved[movie["title"]] for movie in movies]
 
 
 def delete_movie(movie_id: int) -> bool:
-    """Delete movie"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
+    """Delete movie; its assignments and document are deleted with it by cascade"""
+    with get_connection() as conn, get_cursor(conn) as cur:
         cur.execute(
             """DELETE FROM movies
-                WHERE movie_id = %s""", (movie_id,))
+                WHERE movie_id = %s
+                RETURNING movie_id""", (movie_id,))
 
         data = cur.fetchone()
-        conn.commit()
+        if data is not None:
+            bump_versions(cur, ["movies", "genre_assignment", "crew_assignment"])
+    invalidate_reference_caches()
     return data is not None
 
 
+@ttl_cache(REFERENCE_CACHE_TTL)
 def get_genres() -> list[dict[str, str]] | list:
     """Get genres"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
+    with get_connection() as conn, get_cursor(conn) as cur:
         cur.execute("SELECT * FROM genres")
 
         data = cur.fetchall()
-        conn.commit()
     return data
 
 
+@ttl_cache(REFERENCE_CACHE_TTL)
 def get_genre(genre_id: int) -> tuple | None:
     """Get genre"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        cur.execute(f"""SELECT genre FROM genres
-                    WHERE genre_id = {genre_id}""")
+    with get_connection() as conn, get_cursor(conn) as cur:
+        execute_prepared(cur, GENRE_QUERY, (genre_id,))
 
         data = cur.fetchone()
-        conn.commit()
     return data
 
 
-def get_movies_by_genre(genre_id: int) -> list[tuple]:
-    """Get movies by genre"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        cur.execute("""SELECT * FROM movies
-                    JOIN genre_assignment USING(movie_id)
-                    WHERE genre_id = %s""",
-                    (genre_id,))
+def movies_by_genre_query(genre_id: int,
+                          sort_by: str | None = None,
+                          sort_order: str | None = None,
+                          after: list | None = None,
+                          limit: int | None = 100,
+                          fields: list[str] | None = None,
+                          as_json: bool = False) -> tuple[str, list]:
+    """Build the query for movies by genre"""
+    return build_movies_query(
+        "m.genre_ids @> ARRAY[%s]::INT[]", (genre_id,),
+        fields, sort_by, sort_order, after, limit, as_json=as_json)
+
+
+def get_movies_by_genre(genre_id: int,
+                        sort_by: str | None = None,
+                        sort_order: str | None = None,
+                        after: list | None = None,
+                        limit: int = 100,
+                        fields: list[str] | None = None,
+                        as_json: bool = False,
+                        compact: bool = False) -> tuple[list[dict] | CompactRows | str | None,
+                                                        list | None]:
+    """Get a page of movies by genre and the keyset to fetch the next page from"""
+    query, query_params = movies_by_genre_query(genre_id, sort_by, sort_order,
+                                                after, limit, fields, as_json)
+
+    with get_connection() as conn, get_cursor(conn, compact) as cur:
+        if as_json:
+            return fetch_movie_page_json(cur, query, query_params)
+        if compact:
+            return fetch_compact_page(cur, query, query_params, limit)
+        return fetch_movie_page(cur, query, query_params, limit)
+
+
+def stream_movies_by_genre(genre_id: int,
+                           sort_by: str | None = None,
+                           sort_order: str | None = None,
+                           fields: list[str] | None = None,
+                           compact: bool = False) -> Iterator[dict | list | tuple]:
+    """Yield every movie of a genre without holding them all in memory,
+    as iter_movie_rows does"""
+    return iter_movie_rows(*movies_by_genre_query(genre_id, sort_by, sort_order,
+                                                  limit=None, fields=fields),
+                           compact=compact)
+
+
+def search_actor(search_term: str) -> list[dict] | list:
+    """Search actors by any part of their name regardless of case,
+    closest matches first, with the titles of their movies"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        cur.execute(SEARCH_ACTOR_QUERY, (f"%{search_term}%", search_term))
 
         data = cur.fetchall()
-        conn.commit()
     return data
 
 
-def search_actor(search_term: str) -> list[str] | list:
-    """Search actor"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        cur.execute("""SELECT title FROM movies
-                    JOIN crew_assignment USING(movie_id)
-                    JOIN actors USING(actor_id)
-                    WHERE actor LIKE % s""",
-                    (f"%{search_term}%",))
+def movies_by_country_query(country_code: str,
+                            sort_by: str | None = None,
+                            sort_order: str | None = None,
+                            after: list | None = None,
+                            limit: int | None = 100,
+                            fields: list[str] | None = None,
+                            as_json: bool = False) -> tuple[str, list]:
+    """Build the query for movies by country"""
+    return build_movies_query(
+        "m.country = %s", (country_code,), fields, sort_by, sort_order, after, limit,
+        extra_columns=("m.country",), as_json=as_json)
+
+
+def get_movie_by_country(country_code: str,
+                         sort_by: str | None = None,
+                         sort_order: str | None = None,
+                         after: list | None = None,
+                         limit: int = 100,
+                         fields: list[str] | None = None,
+                         as_json: bool = False,
+                         compact: bool = False) -> tuple[list[dict] | CompactRows | str | None,
+                                                         list | None]:
+    """Get a page of movies by country and the keyset to fetch the next page from"""
+    query, query_params = movies_by_country_query(country_code, sort_by, sort_order,
+                                                  after, limit, fields, as_json)
+
+    with get_connection() as conn, get_cursor(conn, compact) as cur:
+        if as_json:
+            return fetch_movie_page_json(cur, query, query_params)
+        if compact:
+            return fetch_compact_page(cur, query, query_params, limit)
+        return fetch_movie_page(cur, query, query_params, limit)
+
+
+def stream_movies_by_country(country_code: str,
+                             sort_by: str | None = None,
+                             sort_order: str | None = None,
+                             fields: list[str] | None = None,
+                             compact: bool = False) -> Iterator[dict | list | tuple]:
+    """Yield every movie of a country without holding them all in memory,
+    as iter_movie_rows does"""
+    return iter_movie_rows(*movies_by_country_query(country_code, sort_by, sort_order,
+                                                    limit=None, fields=fields),
+                           compact=compact)
+
+
+@ttl_cache(REFERENCE_CACHE_TTL)
+def get_countries() -> frozenset[str]:
+    """Get the set of country codes"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        cur.execute("SELECT country FROM countries")
+
+        datas = cur.fetchall()
+    return frozenset(data["country"] for data in datas)
+
+
+def invalidate_reference_caches() -> None:
+    """Forget the cached genres and countries after a write may have added some.
+
+    Only this process's caches are cleared: under several workers the others keep
+    their cached genres and countries for up to REFERENCE_CACHE_TTL seconds."""
+    get_genres.cache_clear()
+    get_genre.cache_clear()
+    get_countries.cache_clear()
+
+
+REPORTS = {
+    "countries": """SELECT country, movie_count, max_budget
+                 FROM report_movies_per_country
+                 ORDER BY movie_count DESC, country""",
+    # As in queries.sql, genres of five movies or fewer are too few to rank by score
+    "genres": """SELECT genre, movie_count, avg_score
+              FROM report_genre_scores
+              WHERE movie_count > 5
+              ORDER BY avg_score DESC, genre""",
+    "languages": """SELECT language, movie_count, total_revenue
+                 FROM report_language_revenue
+                 ORDER BY total_revenue DESC, language""",
+    "genre-countries": """SELECT * FROM (SELECT genre, country, movie_count
+                                       FROM report_genre_country_counts
+                                       ORDER BY movie_count DESC
+                                       FETCH FIRST 10 ROWS WITH TIES) AS top_pairs
+                       ORDER BY genre, movie_count DESC, country"""
+}
+
+REPORT_VIEWS = ("report_movies_per_country", "report_genre_scores",
+                "report_language_revenue", "report_genre_country_counts")
+
+
+def get_report(report: str) -> list[dict]:
+    """Get the rows of a precomputed report by name"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        cur.execute(REPORTS[report])
 
         data = cur.fetchall()
-        conn.commit()
     return data
 
 
-def get_movie_by_country(country_code, sort_by: str | None = None,
-                         sort_order: str | None = None) -> list[dict] | list:
-    """Get movie by country"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        query = """SELECT * FROM movies
-                JOIN countries USING(country_id)
-                WHERE country = %s"""
-        if sort_by:
-            query += f" ORDER BY {sort_by} {sort_order}"
+def refresh_reports() -> None:
+    """Recompute the report views without blocking readers"""
+    with get_connection() as conn, get_cursor(conn) as cur:
+        for view in REPORT_VIEWS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
 
-        cur.execute(query, (country_code,))
 
-        data = cur.fetchall()
-        conn.commit()
-    return data
+def get_table_versions(tables: tuple[str, ...]) -> tuple[str, datetime | None]:
+    """Get the change version of some tables and when they last changed"""
+    with get_connection() as conn, get_cursor(conn, compact=True) as cur:
+        return get_versions(cur, tables)
 
 
-def get_countries() -> list:
-    """Get countries"""
-    conn = get_connection()
-    with get_cursor(conn) as cur:
-        cur.execute("SELECT country FROM countries")
+def get_pool_stats() -> dict:
+    """Get connection pool stats"""
+    return get_pool().stats()
 
-        datas = cur.fetchall()
-        conn.commit()
-    return [data["country"] for data in datas]
+
+def get_dimension_cache_stats() -> dict:
+    """Get lookup table cache stats"""
+    return get_cache_stats()
+
+
+def get_slow_queries() -> list[dict] | None:
+    """Get slow query log entries, or None when the log is not enabled"""
+    return slow_query_log.get_slow_queries()
@@ -0,0 +1,190 @@
+"""In-memory name to id caches for the lookup tables
+
+Ids a transaction looks up or adds are kept with its connection and only cached for
+every thread once it commits, so no thread is handed the id of a row it cannot see
+yet or that is rolled back. Lookup rows are never deleted, so committed ids stay
+valid."""
+
+from collections import OrderedDict
+from os import environ
+from threading import Lock
+
+from psycopg2.extensions import connection
+
+from connection_pool import on_commit, on_rollback
+
+
+class DimensionCache:
+    """Cache of name to id for one lookup table.
+
+    Small tables are loaded whole on first use; large ones keep at most
+    max_size entries and evict the least recently used."""
+
+    def __init__(self, table: str, attribute: str, table_id: str,
+                 max_size: int | None = None, preload: bool = False) -> None:
+        self.table = table
+        self.attribute = attribute
+        self.table_id = table_id
+        self.max_size = max_size
+        self.preload = preload
+
+        self._ids: OrderedDict[str, int] = OrderedDict()
+        self._loaded = False
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name: str) -> int | None:
+        """Get a cached id, counting the hit or miss"""
+        with self._lock:
+            table_id = self._ids.get(name)
+            if table_id is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            if self.max_size is not None:
+                self._ids.move_to_end(name)
+            return table_id
+
+    def put(self, name: str, table_id: int) -> None:
+        """Cache an id, evicting the least recently used entry when full"""
+        with self._lock:
+            self._ids[name] = table_id
+            self._ids.move_to_end(name)
+            if self.max_size is not None and len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+
+    def load(self, cur) -> None:
+        """Load the whole table if this cache is preloaded and not loaded yet"""
+        if not self.preload or self._loaded:
+            return
+
+        cur.execute(f"SELECT {self.attribute}, {self.table_id} FROM {self.table}")
+        rows = cur.fetchall()
+        with self._lock:
+            self._ids.update(rows)
+            self._loaded = True
+
+    def clear(self) -> None:
+        """Forget every cached id"""
+        with self._lock:
+            self._ids.clear()
+            self._loaded = False
+
+    def stats(self) -> dict:
+        """Return cache counters"""
+        with self._lock:
+            return {"size": len(self._ids),
+                    "max_size": self.max_size,
+                    "hits": self.hits,
+                    "misses": self.misses}
+
+
+_large_cache_size = int(environ.get("DIMENSION_CACHE_SIZE", 100000))
+
+caches = {
+    "languages": DimensionCache("languages", "language", "language_id", preload=True),
+    "countries": DimensionCache("countries", "country", "country_id", preload=True),
+    "genres": DimensionCache("genres", "genre", "genre_id", preload=True),
+    "actors": DimensionCache("actors", "actor", "actor_id", max_size=_large_cache_size),
+    "roles": DimensionCache("roles", "role", "role_id", max_size=_large_cache_size),
+}
+
+
+_pending: dict[connection, dict[str, dict[str, int]]] = {}
+_pending_lock = Lock()
+
+
+def clear_caches() -> None:
+    """Forget every cached id"""
+    for cache in caches.values():
+        cache.clear()
+
+
+def pending_ids(conn: connection, table: str) -> dict[str, int]:
+    """Get the ids the open transaction of a connection resolved in a table and
+    that are not cached yet"""
+    with _pending_lock:
+        return _pending.setdefault(conn, {}).setdefault(table, {})
+
+
+def publish_pending(conn: connection) -> None:
+    """Cache the ids resolved by a transaction that has committed"""
+    with _pending_lock:
+        pending = _pending.pop(conn, {})
+
+    for table, ids in pending.items():
+        for name, table_id in ids.items():
+            caches[table].put(name, table_id)
+
+
+def discard_pending(conn: connection) -> None:
+    """Forget the ids resolved by a transaction that was rolled back"""
+    with _pending_lock:
+        _pending.pop(conn, None)
+
+
+on_commit(publish_pending)
+on_rollback(discard_pending)
+
+
+def resolve_id(cur, table: str, value: str) -> int:
+    """Get the id of a lookup value, adding it to the table if it is new"""
+    cache = caches[table]
+    pending = pending_ids(cur.connection, table)
+    name = value.strip()
+    if name in pending:
+        return pending[name]
+
+    with cur.connection.cursor() as lookup:
+        cache.load(lookup)
+        table_id = cache.get(name)
+        if table_id is not None:
+            return table_id
+
+        lookup.execute(f"""INSERT INTO {table} ({cache.attribute})
+                       VALUES (%s)
+                       ON CONFLICT DO NOTHING""", (name,))
+
+        lookup.execute(f"""SELECT {cache.table_id} FROM {table}
+                       WHERE {cache.attribute} = %s""", (name,))
+        table_id = lookup.fetchone()[0]
+
+    pending[name] = table_id
+    return table_id
+
+
+def resolve_ids(cur, table: str, values: list[str]) -> dict[str, int]:
+    """Get the ids of many lookup values at once, adding the new ones with one
+    set-based insert, as a dict keyed by the stripped value"""
+    cache = caches[table]
+    pending = pending_ids(cur.connection, table)
+    ids, missing = {}, []
+
+    with cur.connection.cursor() as lookup:
+        cache.load(lookup)
+        for name in sorted({value.strip() for value in values}):
+            table_id = pending.get(name) or cache.get(name)
+            if table_id is None:
+                missing.append(name)
+            else:
+                ids[name] = table_id
+
+        if missing:
+            lookup.execute(f"""INSERT INTO {table} ({cache.attribute})
+                           SELECT UNNEST(%s::VARCHAR[])
+                           ON CONFLICT DO NOTHING""", (missing,))
+
+            lookup.execute(f"""SELECT {cache.attribute}, {cache.table_id} FROM {table}
+                           WHERE {cache.attribute} = ANY(%s::VARCHAR[])""", (missing,))
+            for name, table_id in lookup.fetchall():
+                pending[name] = table_id
+                ids[name] = table_id
+
+    return ids
+
+
+def get_cache_stats() -> dict:
+    """Return the counters of every lookup table cache"""
+    return {table: cache.stats() for table, cache in caches.items()}
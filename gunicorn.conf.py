@@ -0,0 +1,51 @@
+"""Gunicorn settings for serving the API in production:
+
+    gunicorn api:app
+
+Workers are forked from a master that has already imported the app, and each
+worker opens its own connection pool after the fork. Each pool holds at most
+API_THREADS connections unless DATABASE_POOL_MAX_SIZE says otherwise, so the server
+opens at most API_WORKERS x DATABASE_POOL_MAX_SIZE connections in total; keep that
+within the database's max_connections (DATABASE_MAX_CONNECTIONS, default 100)."""
+
+from multiprocessing import cpu_count
+from os import environ
+
+from psycopg2 import OperationalError
+
+from connection_pool import get_pool, reset_pool
+
+bind = environ.get("API_BIND", "0.0.0.0:5000")
+# Threads already overlap requests waiting on the database, so one worker per core
+# is enough and keeps the connection count low
+workers = int(environ.get("API_WORKERS", cpu_count() + 1))
+threads = int(environ.get("API_THREADS", 4))
+environ.setdefault("DATABASE_POOL_MAX_SIZE", str(threads))
+worker_class = "gthread"
+preload_app = True
+timeout = int(environ.get("API_TIMEOUT", 30))
+graceful_timeout = int(environ.get("API_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+max_requests = int(environ.get("API_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+accesslog = environ.get("API_ACCESS_LOG")
+
+
+def on_starting(server):
+    """Warn when the workers' pools could open more connections than the database allows"""
+    connections = workers * int(environ["DATABASE_POOL_MAX_SIZE"])
+    max_connections = int(environ.get("DATABASE_MAX_CONNECTIONS", 100))
+    if connections > max_connections:
+        server.log.warning("%s workers with pools of up to %s connections may open %s "
+                           "connections, more than DATABASE_MAX_CONNECTIONS (%s)",
+                           workers, environ["DATABASE_POOL_MAX_SIZE"], connections,
+                           max_connections)
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Give each worker its own pool instead of the master's connections"""
+    reset_pool(close=False)
+    try:
+        get_pool()
+    except OperationalError as e:
+        server.log.warning("Worker %s could not connect to the database yet: %s", worker.pid, e)
@@ -1,25 +1,23 @@
 """A script to import all of the movies in imdb_movies.csv into the database"""
 
 import csv
-from os import environ
-
-from rich.progress import track
-from dotenv import load_dotenv
-from psycopg2 import connect
-from psycopg2.extras import RealDictCursor
-from psycopg2.extensions import connection
-
-
-def get_connection() -> connection:
-    """Get connection"""
-    load_dotenv()
-    return connect(
-        user=environ["DATABASE_USERNAME"],
-        password=environ["DATABASE_PASSWORD"],
-        host=environ["DATABASE_IP"],
-        port=environ["DATABASE_PORT"],
-        database=environ["DATABASE_NAME"]
-    )
+from argparse import ArgumentParser
+from io import StringIO
+from itertools import islice
+from multiprocessing import Pool
+from os import cpu_count
+from os.path import abspath
+from threading import BoundedSemaphore
+from time import perf_counter
+from typing import Iterable, Iterator, TextIO
+from uuid import uuid4
+
+from rich.progress import Progress, track
+
+from connection_pool import get_connection, reset_pool
+from dimension_cache import resolve_id
+from movie_documents import refresh_documents
+from table_versions import MOVIE_TABLES, bump_versions
 
 
 def load_csv(filename: str) -> list[dict]:
@@ -28,16 +26,36 @@ def load_csv(filename: str) -> list[dict]:
         return list(csv.DictReader(f, skipinitialspace=True))
 
 
-def get_id(cur, value, table, attribute, table_id):
-    """Add value to table and return the id"""
-    cur.execute(f"""INSERT INTO {table} ({attribute})
-                VALUES (%s)
-                ON CONFLICT DO NOTHING""", (value.strip(),))
+def iter_csv(filename: str) -> Iterator[dict]:
+    """Yield the rows of a csv file one at a time"""
+    with open(filename, newline='', encoding="utf-8") as f:
+        yield from csv.DictReader(f, skipinitialspace=True)
+
 
-    cur.execute(f"""SELECT {table_id} FROM {table}
-                WHERE {attribute} = %s""", (value.strip(),))
+def chunked(rows: Iterable[dict], size: int) -> Iterator[list[dict]]:
+    """Group rows into lists of at most size rows"""
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
 
-    return cur.fetchone()[table_id]
+
+def clean_movie(movie: dict) -> dict:
+    """Strip the whitespace, non-breaking spaces included, around every value and
+    around every name in the genre and crew lists, which may be comma separated
+    strings or lists, so every import path stores the same names"""
+    cleaned = {}
+    for column, value in movie.items():
+        if column in ("genre", "crew"):
+            names = value if isinstance(value, list) else (value or "").split(",")
+            cleaned[column] = ",".join(name.strip() for name in names)
+        else:
+            cleaned[column] = value.strip() if isinstance(value, str) else value
+    return cleaned
+
+
+def get_id(cur, value, table, attribute, table_id):  # pylint: disable=unused-argument
+    """Add value to table and return the id, using the cached id when known"""
+    return resolve_id(cur, table, value)
 
 
 def get_movie_id(cur, title, date, score, overview, orig_title,
@@ -55,15 +73,16 @@ def get_movie_id(cur, title, date, score, overview, orig_title,
                     FROM movies
                     WHERE title = %s""", (title,))
 
-    return cur.fetchone()['movie_id']
+    return cur.fetchone()[0]
 
 
-def import_movies_to_database(movies: list[dict]) -> list[dict]:
+def import_movies_to_database(movies: Iterable[dict]) -> Iterable[dict]:
     """Import movies to database"""
-    conn = get_connection()
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
+    with get_connection() as conn, conn.cursor() as cur:
+        movie_ids = []
 
         for movie in track(movies, description="Adding movies"):
+            movie = clean_movie(movie)
             language_id = get_id(
                 cur, movie["language"], "languages", "language", "language_id")
 
@@ -81,6 +100,7 @@ def import_movies_to_database(movies: list[dict]) -> list[dict]:
                 movie["budget"],
                 movie["revenue"],
                 country_id)
+            movie_ids.append(movie_id)
 
             genres = movie["genre"].split(",")
 
@@ -105,15 +125,334 @@ def import_movies_to_database(movies: list[dict]) -> list[dict]:
                     f"""INSERT INTO crew_assignment(movie_id, actor_id, role_id)
                     VALUES ({movie_id}, {actor_id}, {role_id})""")
 
+        refresh_documents(cur, movie_ids)
+        bump_versions(cur, MOVIE_TABLES)
+
+    return movies
+
+
+CSV_COLUMNS = ("title", "release_date", "score", "genre", "overview", "crew",
+               "orig_title", "status", "language", "budget", "revenue", "country")
+
+
+def create_staging_table(cur, staging: str, temporary: bool = True) -> None:
+    """Create a text-only table to COPY raw csv rows into"""
+    columns = ", ".join(f"{column} TEXT" for column in CSV_COLUMNS)
+    cur.execute(f"DROP TABLE IF EXISTS {staging}")
+    cur.execute(f"""CREATE {"TEMPORARY" if temporary else "UNLOGGED"} TABLE {staging} (
+                staging_id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+                {columns})""")
+
+
+def copy_csv_to_staging(cur, file: TextIO, staging: str, batch_size: int = 50000) -> int:
+    """COPY a csv file into the staging table, cleaned as clean_movie does, and return
+    the number of rows staged"""
+    reader = csv.DictReader(file, skipinitialspace=True)
+    reader.fieldnames = [column.strip() for column in reader.fieldnames or []]
+    unknown = set(reader.fieldnames) - set(CSV_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown csv columns: {', '.join(sorted(unknown))}")
+
+    rows = 0
+    for chunk in chunked(reader, batch_size):
+        copy_numbered_rows_to_staging(cur, chunk, staging, rows + 1)
+        rows += len(chunk)
+    return rows
+
+
+def copy_rows_to_staging(cur, rows: list[dict], staging: str) -> None:
+    """COPY already parsed csv rows into the empty staging table"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([clean_movie(row).get(column) for column in CSV_COLUMNS] for row in rows)
+    buffer.seek(0)
+
+    cur.execute(f"TRUNCATE {staging} RESTART IDENTITY")
+    cur.copy_expert(f"""COPY {staging} ({", ".join(CSV_COLUMNS)})
+                    FROM STDIN WITH (FORMAT csv)""", buffer)
+
+
+def copy_numbered_rows_to_staging(cur, rows: list[dict], staging: str, first_id: int) -> None:
+    """COPY parsed csv rows into the staging table as staging_id first_id onwards,
+    alongside rows other connections are copying"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([first_id + number] + [row.get(column) for column in CSV_COLUMNS]
+                     for number, row in enumerate(map(clean_movie, rows)))
+    buffer.seek(0)
+
+    cur.copy_expert(f"""COPY {staging} (staging_id, {", ".join(CSV_COLUMNS)})
+                    FROM STDIN WITH (FORMAT csv)""", buffer)
+
+
+def load_dimensions(cur, staging: str) -> None:
+    """Add every language, country, genre, actor and role in the staging table
+    with one set-based statement per table"""
+    for table, attribute in (("languages", "language"), ("countries", "country")):
+        cur.execute(f"""INSERT INTO {table} ({attribute})
+                    SELECT TRIM({attribute}) FROM {staging}
+                    WHERE TRIM({attribute}) <> ''
+                    GROUP BY TRIM({attribute})
+                    ORDER BY MIN(staging_id)
+                    ON CONFLICT DO NOTHING""")
+
+    cur.execute(f"""INSERT INTO genres (genre)
+                SELECT TRIM(g.name) FROM {staging} s
+                CROSS JOIN UNNEST(STRING_TO_ARRAY(s.genre, ',')) AS g(name)
+                WHERE TRIM(g.name) <> ''
+                GROUP BY TRIM(g.name)
+                ORDER BY MIN(s.staging_id)
+                ON CONFLICT DO NOTHING""")
+
+    for table, attribute, offset in (("actors", "actor", 1), ("roles", "role", 0)):
+        cur.execute(f"""INSERT INTO {table} ({attribute})
+                    SELECT TRIM(c.name) FROM {staging} s
+                    CROSS JOIN UNNEST(STRING_TO_ARRAY(s.crew, ','))
+                        WITH ORDINALITY AS c(name, position)
+                    WHERE c.position % 2 = {offset} AND TRIM(c.name) <> ''
+                    GROUP BY TRIM(c.name)
+                    ORDER BY MIN(s.staging_id)
+                    ON CONFLICT DO NOTHING""")
+
+
+def load_staged_movies(cur, staging: str, first_id: int, last_id: int) -> int:
+    """Insert the movies, genre assignments and crew assignments for one range
+    of staged rows and rebuild their documents, returning the number of new movies"""
+    inserted = load_staged_movie_rows(cur, staging, first_id, last_id)
+    load_staged_assignments(cur, staging, first_id, last_id)
+    refresh_staged_documents(cur, staging, first_id, last_id)
+    return inserted
+
+
+def load_staged_movie_rows(cur, staging: str, first_id: int, last_id: int) -> int:
+    """Insert the movies of one range of staged rows in staging order,
+    returning the number of new movies"""
+    cur.execute(f"""INSERT INTO movies (title, release_date, score, overview, orig_title,
+                    status, language_id, budget, revenue, country_id)
+                SELECT TRIM(s.title), s.release_date::DATE, s.score::FLOAT, s.overview,
+                    s.orig_title, s.status, l.language_id, s.budget::FLOAT,
+                    s.revenue::FLOAT, c.country_id
+                FROM {staging} s
+                JOIN languages l ON l.language = TRIM(s.language)
+                JOIN countries c ON c.country = TRIM(s.country)
+                WHERE s.staging_id BETWEEN %s AND %s
+                ORDER BY s.staging_id
+                ON CONFLICT DO NOTHING""", (first_id, last_id))
+    return cur.rowcount
+
+
+def load_staged_assignments(cur, staging: str, first_id: int, last_id: int) -> None:
+    """Insert the genre and crew assignments of one range of staged rows
+    whose movies are already loaded"""
+    cur.execute(f"""INSERT INTO genre_assignment (movie_id, genre_id)
+                SELECT m.movie_id, g.genre_id
+                FROM {staging} s
+                JOIN movies m ON m.title = TRIM(s.title)
+                CROSS JOIN UNNEST(STRING_TO_ARRAY(s.genre, ',')) AS n(name)
+                JOIN genres g ON g.genre = TRIM(n.name)
+                WHERE s.staging_id BETWEEN %s AND %s
+                ORDER BY s.staging_id""", (first_id, last_id))
+
+    cur.execute(f"""INSERT INTO crew_assignment (movie_id, actor_id, role_id)
+                SELECT m.movie_id, a.actor_id, r.role_id
+                FROM {staging} s
+                JOIN movies m ON m.title = TRIM(s.title)
+                CROSS JOIN LATERAL STRING_TO_ARRAY(s.crew, ',') AS c(names)
+                CROSS JOIN LATERAL GENERATE_SERIES(1, CARDINALITY(c.names) / 2) AS p(pair)
+                JOIN actors a ON a.actor = TRIM(c.names[2 * p.pair - 1])
+                JOIN roles r ON r.role = TRIM(c.names[2 * p.pair])
+                WHERE s.staging_id BETWEEN %s AND %s
+                ORDER BY s.staging_id, p.pair""", (first_id, last_id))
+
+
+def refresh_staged_documents(cur, staging: str, first_id: int, last_id: int) -> None:
+    """Rebuild the documents of the movies of one range of staged rows"""
+    cur.execute(f"""SELECT DISTINCT m.movie_id
+                FROM {staging} s
+                JOIN movies m ON m.title = TRIM(s.title)
+                WHERE s.staging_id BETWEEN %s AND %s""", (first_id, last_id))
+    refresh_documents(cur, [row[0] for row in cur.fetchall()])
+
+
+def bulk_import_movies(filename: str, batch_size: int = 10000) -> int:
+    """Import a csv file with COPY and set-based inserts instead of row by row,
+    returning the number of rows read"""
+    started = perf_counter()
+    staging = "movie_staging"
+
+    with get_connection() as conn, conn.cursor() as cur:
+        create_staging_table(cur, staging)
+        with open(filename, newline='', encoding="utf-8") as f:
+            rows = copy_csv_to_staging(cur, f, staging)
+
+        load_dimensions(cur, staging)
+
+        for first_id in track(range(1, rows + 1, batch_size), description="Adding movies"):
+            load_staged_movies(cur, staging, first_id, first_id + batch_size - 1)
+
+        cur.execute(f"DROP TABLE {staging}")
+        bump_versions(cur, MOVIE_TABLES)
+
+    elapsed = perf_counter() - started
+    print(f"Imported {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+    return rows
+
+
+def get_checkpoint(cur, filename: str) -> int:
+    """Get the number of rows of a file already committed by a streaming import"""
+    cur.execute("""SELECT rows_committed FROM import_checkpoints
+                WHERE filename = %s""", (filename,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def set_checkpoint(cur, filename: str, rows_committed: int) -> None:
+    """Record how many rows of a file have been committed"""
+    cur.execute("""INSERT INTO import_checkpoints (filename, rows_committed)
+                VALUES (%s, %s)
+                ON CONFLICT (filename) DO UPDATE
+                SET rows_committed = EXCLUDED.rows_committed, updated_at = NOW()""",
+                (filename, rows_committed))
+
+
+def stream_import_movies(filename: str, chunk_size: int = 5000, resume: bool = False) -> int:
+    """Import a csv file in committed chunks without loading it into memory,
+    returning the number of rows imported by this run.
+
+    Each chunk is committed together with its checkpoint, so an interrupted import
+    can be resumed from the last committed chunk."""
+    started = perf_counter()
+    staging = "movie_staging"
+    checkpoint_name = abspath(filename)
+    imported = 0
+
+    with get_connection() as conn, conn.cursor() as cur:
+        skip = get_checkpoint(cur, checkpoint_name) if resume else 0
+        create_staging_table(cur, staging)
+        set_checkpoint(cur, checkpoint_name, skip)
         conn.commit()
 
-        cur.execute("SELECT * FROM movies")
-        print(cur.fetchall())
+        rows = islice(iter_csv(filename), skip, None)
+        for chunk in track(chunked(rows, chunk_size), description="Adding movies"):
+            copy_rows_to_staging(cur, chunk, staging)
+            load_dimensions(cur, staging)
+            load_staged_movies(cur, staging, 1, len(chunk))
 
-    conn.close()
-    return movies
+            imported += len(chunk)
+            set_checkpoint(cur, checkpoint_name, skip + imported)
+            bump_versions(cur, MOVIE_TABLES)
+            conn.commit()
+
+        cur.execute(f"DROP TABLE {staging}")
+
+    elapsed = perf_counter() - started
+    print(f"Imported {imported} rows in {elapsed:.1f}s ({imported / elapsed:.0f} rows/s)")
+    return imported
+
+
+def _start_worker() -> None:
+    """Give a forked import worker its own connections instead of the parent's"""
+    reset_pool(close=False)
+
+
+def _stage_chunk(task: tuple[str, int, list[dict]]) -> int:
+    """Copy one chunk of rows into the shared staging table"""
+    staging, first_id, rows = task
+    with get_connection() as conn, conn.cursor() as cur:
+        copy_numbered_rows_to_staging(cur, rows, staging, first_id)
+    return len(rows)
+
+
+def _load_assignments(task: tuple[str, int, int]) -> int:
+    """Load the genre and crew assignments of one range of staged rows
+    and rebuild the documents of its movies"""
+    staging, first_id, last_id = task
+    with get_connection() as conn, conn.cursor() as cur:
+        load_staged_assignments(cur, staging, first_id, last_id)
+        refresh_staged_documents(cur, staging, first_id, last_id)
+    return last_id - first_id + 1
+
+
+def parallel_import_movies(filename: str, workers: int | None = None,
+                           chunk_size: int = 10000) -> int:
+    """Import a csv file on several processes, returning the number of rows read.
+
+    Chunks of rows are numbered in file order and copied into an unlogged staging
+    table by every worker at once. The languages, countries, genres, actors, roles
+    and movies are then added once, in file order, so ids are the same as a
+    single process import; finally the workers load the genre and crew assignments
+    and the documents of separate ranges of rows on their own connections."""
+    started = perf_counter()
+    workers = workers or cpu_count()
+    # Unique per run so concurrent imports never drop each other's staging rows
+    staging = f"movie_staging_{uuid4().hex}"
+
+    with get_connection() as conn, conn.cursor() as cur:
+        create_staging_table(cur, staging, temporary=False)
+
+    try:
+        with Progress() as progress, Pool(workers, initializer=_start_worker) as pool:
+            # Read at most two chunks per worker ahead of the ones being copied
+            ahead = BoundedSemaphore(workers * 2)
+
+            def chunks() -> Iterator[tuple[str, int, list[dict]]]:
+                for number, rows in enumerate(chunked(iter_csv(filename), chunk_size)):
+                    ahead.acquire()  # pylint: disable=consider-using-with
+                    yield staging, number * chunk_size + 1, rows
+
+            staged = progress.add_task("Staging rows", total=None)
+            rows = 0
+            for count in pool.imap_unordered(_stage_chunk, chunks()):
+                ahead.release()
+                rows += count
+                progress.advance(staged, count)
+            progress.update(staged, total=rows)
+
+            added = progress.add_task("Adding lookup values and movies", total=2)
+            with get_connection() as conn, conn.cursor() as cur:
+                load_dimensions(cur, staging)
+                progress.advance(added)
+                load_staged_movie_rows(cur, staging, 1, rows)
+                bump_versions(cur, MOVIE_TABLES)
+            progress.advance(added)
+
+            assigned = progress.add_task("Adding genres and crew", total=rows)
+            ranges = [(staging, first_id, min(first_id + chunk_size - 1, rows))
+                      for first_id in range(1, rows + 1, chunk_size)]
+            for count in pool.imap_unordered(_load_assignments, ranges):
+                progress.advance(assigned, count)
+    finally:
+        with get_connection() as conn, conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {staging}")
+            bump_versions(cur, MOVIE_TABLES)
+
+    elapsed = perf_counter() - started
+    print(f"Imported {rows} rows with {workers} workers in {elapsed:.1f}s "
+          f"({rows / elapsed:.0f} rows/s)")
+    return rows
 
 
 if __name__ == "__main__":
-    load_movies = load_csv("imdb_movies.csv")
-    import_movies_to_database(load_movies)
+    parser = ArgumentParser(description="Import movies from a csv file")
+    parser.add_argument("filename", nargs="?", default="imdb_movies.csv")
+    parser.add_argument("--bulk", action="store_true",
+                        help="stage the file with COPY and insert set-based batches")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--stream", action="store_true",
+                        help="read the file incrementally and commit every --chunk-size rows")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--resume", action="store_true",
+                        help="with --stream, skip the rows committed by a previous run")
+    parser.add_argument("--parallel", action="store_true",
+                        help="stage and load --chunk-size rows at a time on --workers processes")
+    parser.add_argument("--workers", type=int, default=cpu_count())
+    args = parser.parse_args()
+
+    if args.parallel:
+        parallel_import_movies(args.filename, args.workers, args.chunk_size)
+    elif args.bulk:
+        bulk_import_movies(args.filename, args.batch_size)
+    elif args.stream:
+        stream_import_movies(args.filename, args.chunk_size, args.resume)
+    else:
+        import_movies_to_database(iter_csv(args.filename))
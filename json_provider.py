@@ -0,0 +1,60 @@
+"""Faster JSON encoding for the Flask app
+
+orjson is optional: when it is installed (and JSON_PROVIDER is not "default") the app
+encodes responses with it, falling back to Flask's provider otherwise."""
+
+from os import environ
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that encodes with orjson but produces the same documents as
+    Flask's default provider: sorted keys, dates and datetimes as HTTP dates and
+    decimals as strings. Non-ASCII characters are written as UTF-8, not escaped."""
+
+    # orjson is a C extension whose members pylint cannot see
+    # pylint: disable=no-member
+
+    def _options(self) -> int:
+        """Get the orjson options matching this provider's settings"""
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return options
+
+    def dumps(self, obj, **kwargs) -> str:
+        """Serialize data as JSON to a string, using json.dumps for unusual arguments"""
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode()
+
+    def loads(self, s: str | bytes, **kwargs):
+        """Deserialize data from JSON, using json.loads for unusual arguments"""
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        """Serialize the arguments as a JSON response without decoding the bytes orjson
+        produces, indenting it in debug mode as Flask does"""
+        obj = self._prepare_response_obj(args, kwargs)
+        options = self._options() | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            options |= orjson.OPT_INDENT_2
+
+        return self._app.response_class(orjson.dumps(obj, default=self.default, option=options),
+                                        mimetype=self.mimetype)
+
+
+def create_json_provider(app: Flask) -> JSONProvider:
+    """Get the fastest JSON provider available, unless JSON_PROVIDER=default"""
+    if orjson is not None and environ.get("JSON_PROVIDER", "orjson") == "orjson":
+        return OrjsonProvider(app)
+    return DefaultJSONProvider(app)
@@ -0,0 +1,202 @@
+"""Request and SQL timings, exposed as Server-Timing headers and in the Prometheus text format"""
+
+import sys
+from bisect import bisect_left
+from threading import Lock, local
+from time import perf_counter
+from typing import Callable
+
+from psycopg2.extensions import cursor
+from psycopg2.extras import RealDictCursor
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    """Format label names and values as {name="value",...}"""
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Counter:
+    """Thread-safe counter per combination of label values"""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """Add to the counter of these label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        """Render the counter as Prometheus text lines"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """Thread-safe histogram per combination of label values"""
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._values: dict[tuple, list] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        """Record a value for these label values"""
+        with self._lock:
+            counts = self._values.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0])
+            counts[0][bisect_left(self.buckets, value)] += 1
+            counts[1] += value
+
+    def render(self) -> list[str]:
+        """Render the histogram as Prometheus text lines with cumulative buckets"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    cumulative += count
+                    bucket_labels = _labels(self.labels + ("le",), labels + (bound,))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+request_latency = Histogram("http_request_duration_seconds",
+                            "Time to handle a request, by route and status",
+                            ("method", "route", "status"))
+query_latency = Histogram("db_query_duration_seconds",
+                          "Time to run a statement, by the function that ran it",
+                          ("function",))
+query_rows = Counter("db_query_rows_total",
+                     "Rows returned or changed by statements, by the function that ran them",
+                     ("function",))
+
+_trace = local()
+_HELPERS = ("psycopg2", "prepared_statements")
+_query_listeners: list[Callable[[str, object, object, float], None]] = []
+
+
+def on_query(listener: Callable[[str, object, object, float], None]) -> None:
+    """Register a callback run with (function, query, params, seconds) after every
+    statement a timed cursor runs"""
+    _query_listeners.append(listener)
+
+
+def start_trace() -> None:
+    """Start collecting the queries this thread runs, e.g. for one request"""
+    _trace.queries = []
+
+
+def end_trace() -> list[tuple[str, float, int]]:
+    """Stop collecting and return the (function, seconds, rows) of every query run
+    since start_trace"""
+    queries = getattr(_trace, "queries", None) or []
+    _trace.queries = None
+    return queries
+
+
+def _caller() -> str:
+    """Get the name of the function that ran a statement, looking past psycopg2 helpers
+    and prepared statements"""
+    frame = sys._getframe(3)  # pylint: disable=protected-access
+    while frame is not None and frame.f_globals.get("__name__", "").startswith(_HELPERS):
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "unknown"
+
+
+def record_query(function: str, seconds: float, rows: int) -> None:
+    """Record one statement in the metrics and in this thread's trace"""
+    query_latency.observe(seconds, function)
+    query_rows.inc(function, amount=max(rows, 0))
+    queries = getattr(_trace, "queries", None)
+    if queries is not None:
+        queries.append((function, seconds, rows))
+
+
+class TimedCursorMixin:
+    """Time every statement a cursor runs and count the rows it returns or changes"""
+
+    def _record(self, query, params, started: float) -> None:
+        """Record a statement and pass it on to the query listeners"""
+        seconds = perf_counter() - started
+        function = _caller()
+        record_query(function, seconds, self.rowcount)
+        for listener in _query_listeners:
+            listener(function, query, params, seconds)
+
+    def execute(self, query, vars=None):  # pylint: disable=redefined-builtin
+        """Execute a statement and record it"""
+        started = perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, vars, started)
+
+    def executemany(self, query, vars_list):
+        """Execute a statement for every set of parameters and record it as one round trip"""
+        started = perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, vars_list, started)
+
+
+class TimedCursor(TimedCursorMixin, cursor):
+    """Tuple cursor that records its statements"""
+
+
+class TimedDictCursor(TimedCursorMixin, RealDictCursor):
+    """Dict cursor that records its statements"""
+
+
+def server_timing(total: float, queries: list[tuple[str, float, int]],
+                  max_queries: int = 10) -> str:
+    """Build a Server-Timing header splitting a request's time between the database
+    and the application, with the slowest queries named"""
+    database = sum(seconds for _, seconds, _ in queries)
+    rows = sum(max(count, 0) for _, _, count in queries)
+    metrics = [f'db;dur={database * 1000:.2f};desc="{len(queries)} queries, {rows} rows"']
+    slowest = sorted(enumerate(queries), key=lambda query: -query[1][1])[:max_queries]
+    for number, (function, seconds, count) in sorted(slowest):
+        metrics.append(f'q{number + 1};dur={seconds * 1000:.2f};desc="{function} ({count} rows)"')
+    metrics.append(f"app;dur={max(total - database, 0) * 1000:.2f}")
+    metrics.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+def gauges(name: str, description: str, label: str, values: dict[str, dict]) -> list[str]:
+    """Render a gauge per key and counter, e.g. cache sizes by table"""
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+    for key, counters in sorted(values.items()):
+        for counter, value in sorted(counters.items()):
+            if isinstance(value, (int, float)):
+                lines.append(f"{name}{_labels((label, 'counter'), (key, counter))} {value}")
+    return lines
+
+
+def render_metrics(*extra: list[str]) -> str:
+    """Render every metric, and any extra lines, in the Prometheus text format"""
+    lines = request_latency.render() + query_latency.render() + query_rows.render()
+    for group in extra:
+        lines += group
+    return "\n".join(lines) + "\n"
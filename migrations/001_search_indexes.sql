@@ -0,0 +1,11 @@
+-- Indexed, case-insensitive search over movie titles, overviews and actor names
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE movies ADD COLUMN IF NOT EXISTS search_document TSVECTOR GENERATED ALWAYS AS (
+    TO_TSVECTOR('english', title || ' ' || orig_title || ' ' || overview)
+) STORED;
+
+CREATE INDEX IF NOT EXISTS movies_search_document_idx ON movies USING GIN (search_document);
+CREATE INDEX IF NOT EXISTS movies_title_trgm_idx ON movies USING GIN (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS actors_actor_trgm_idx ON actors USING GIN (actor gin_trgm_ops);
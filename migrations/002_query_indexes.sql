@@ -0,0 +1,10 @@
+-- Indexes for the foreign keys and filters used by the API and queries.sql
+
+CREATE INDEX IF NOT EXISTS movies_country_id_idx ON movies (country_id, movie_id);
+CREATE INDEX IF NOT EXISTS movies_language_id_idx ON movies (language_id);
+CREATE INDEX IF NOT EXISTS movies_release_date_idx ON movies (release_date, movie_id);
+CREATE INDEX IF NOT EXISTS movies_score_idx ON movies (score, movie_id);
+CREATE INDEX IF NOT EXISTS genre_assignment_movie_id_idx ON genre_assignment (movie_id, genre_id);
+CREATE INDEX IF NOT EXISTS genre_assignment_genre_id_idx ON genre_assignment (genre_id, movie_id);
+CREATE INDEX IF NOT EXISTS crew_assignment_movie_id_idx ON crew_assignment (movie_id, actor_id);
+CREATE INDEX IF NOT EXISTS crew_assignment_actor_id_idx ON crew_assignment (actor_id);
@@ -0,0 +1,41 @@
+-- Precomputed summaries behind the /stats endpoints, refreshed by refresh_reports.py
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_movies_per_country AS
+SELECT country, COUNT(*) AS movie_count, MAX(budget) AS max_budget
+FROM movies
+JOIN countries USING(country_id)
+GROUP BY country;
+
+CREATE UNIQUE INDEX IF NOT EXISTS report_movies_per_country_idx
+ON report_movies_per_country (country);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_genre_scores AS
+SELECT genre, COUNT(*) AS movie_count, AVG(score) AS avg_score
+FROM movies
+JOIN genre_assignment USING(movie_id)
+JOIN genres USING(genre_id)
+GROUP BY genre;
+
+CREATE UNIQUE INDEX IF NOT EXISTS report_genre_scores_idx ON report_genre_scores (genre);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_language_revenue AS
+SELECT language, COUNT(*) AS movie_count, SUM(revenue) AS total_revenue
+FROM movies
+JOIN languages USING(language_id)
+GROUP BY language;
+
+CREATE UNIQUE INDEX IF NOT EXISTS report_language_revenue_idx
+ON report_language_revenue (language);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS report_genre_country_counts AS
+SELECT genre, country, COUNT(*) AS movie_count
+FROM genres
+JOIN genre_assignment USING(genre_id)
+JOIN movies USING(movie_id)
+JOIN countries USING(country_id)
+GROUP BY genre, country;
+
+CREATE UNIQUE INDEX IF NOT EXISTS report_genre_country_counts_idx
+ON report_genre_country_counts (genre, country);
+CREATE INDEX IF NOT EXISTS report_genre_country_counts_movie_count_idx
+ON report_genre_country_counts (movie_count DESC);
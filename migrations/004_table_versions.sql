@@ -0,0 +1,13 @@
+-- Change counters behind the ETag and Last-Modified of the list endpoints,
+-- bumped by the write functions in database.py and by the importer
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO table_versions (table_name)
+VALUES ('movies'), ('genre_assignment'), ('crew_assignment'), ('genres'),
+    ('countries'), ('languages'), ('actors'), ('roles')
+ON CONFLICT DO NOTHING;
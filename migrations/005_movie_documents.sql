@@ -0,0 +1,69 @@
+-- Denormalised read model behind the movie list and search endpoints, one row per
+-- movie, kept up to date by the write functions in database.py and by the importer.
+-- The search column of movies and its indexes from migration 001 are dropped: search
+-- reads movie_documents instead. The release_date and score indexes of migration 002
+-- stay for the reports in queries.sql.
+
+CREATE TABLE IF NOT EXISTS movie_documents (
+    movie_id INT PRIMARY KEY,
+    title VARCHAR NOT NULL,
+    release_date DATE NOT NULL,
+    score FLOAT NOT NULL,
+    overview VARCHAR NOT NULL,
+    orig_title VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    language_id INT,
+    budget FLOAT NOT NULL,
+    revenue FLOAT NOT NULL,
+    country_id INT,
+    country CHAR(2),
+    language VARCHAR,
+    genres VARCHAR[] NOT NULL DEFAULT '{}',
+    genre_ids INT[] NOT NULL DEFAULT '{}',
+    crew JSONB NOT NULL DEFAULT '[]',
+    genre_sort VARCHAR GENERATED ALWAYS AS (COALESCE(genres[1], '')) STORED,
+    search_document TSVECTOR GENERATED ALWAYS AS (
+        TO_TSVECTOR('english', title || ' ' || orig_title || ' ' || overview)
+    ) STORED,
+    FOREIGN KEY (movie_id) REFERENCES movies ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS movie_documents_country_idx ON movie_documents (country, movie_id);
+CREATE INDEX IF NOT EXISTS movie_documents_genre_ids_idx ON movie_documents USING GIN (genre_ids);
+CREATE INDEX IF NOT EXISTS movie_documents_title_idx ON movie_documents (title, movie_id);
+CREATE INDEX IF NOT EXISTS movie_documents_release_date_idx
+ON movie_documents (release_date, movie_id);
+CREATE INDEX IF NOT EXISTS movie_documents_score_idx ON movie_documents (score, movie_id);
+CREATE INDEX IF NOT EXISTS movie_documents_genre_sort_idx
+ON movie_documents (genre_sort, movie_id);
+CREATE INDEX IF NOT EXISTS movie_documents_search_document_idx
+ON movie_documents USING GIN (search_document);
+CREATE INDEX IF NOT EXISTS movie_documents_title_trgm_idx
+ON movie_documents USING GIN (title gin_trgm_ops);
+
+INSERT INTO movie_documents (movie_id, title, release_date, score, overview, orig_title,
+    status, language_id, budget, revenue, country_id, country, language, genres,
+    genre_ids, crew)
+SELECT m.movie_id, m.title, m.release_date, m.score, m.overview, m.orig_title,
+    m.status, m.language_id, m.budget, m.revenue, m.country_id, c.country, l.language,
+    ARRAY(SELECT g.genre FROM genre_assignment ga
+          JOIN genres g USING(genre_id)
+          WHERE ga.movie_id = m.movie_id
+          ORDER BY g.genre),
+    ARRAY(SELECT DISTINCT ga.genre_id FROM genre_assignment ga
+          WHERE ga.movie_id = m.movie_id),
+    COALESCE((SELECT JSONB_AGG(JSONB_BUILD_OBJECT('actor', a.actor, 'role', r.role)
+                               ORDER BY ca.crew_assignment_id)
+              FROM crew_assignment ca
+              JOIN actors a USING(actor_id)
+              JOIN roles r USING(role_id)
+              WHERE ca.movie_id = m.movie_id), '[]')
+FROM movies m
+LEFT JOIN countries c ON c.country_id = m.country_id
+LEFT JOIN languages l ON l.language_id = m.language_id
+ON CONFLICT (movie_id) DO NOTHING;
+
+ANALYZE movie_documents;
+
+DROP INDEX IF EXISTS movies_search_document_idx, movies_title_trgm_idx;
+ALTER TABLE movies DROP COLUMN IF EXISTS search_document;
@@ -0,0 +1,51 @@
+"""Denormalised read model behind the movie list and search queries
+
+movie_documents holds one row per movie with its country code, language, genres and
+crew alongside the movie's own columns, so listing movies reads a single table.
+Every write rebuilds the documents of the movies it changed in its own transaction,
+and deleting a movie cascades to its document. Languages, countries, genres, actors
+and roles are only ever added, never renamed, so their changes need no rebuild."""
+
+from typing import Iterable
+
+DOCUMENT_FIELDS = ("movie_id", "title", "release_date", "score", "overview", "orig_title",
+                   "status", "language_id", "budget", "revenue", "country_id",
+                   "country", "language", "genres", "genre_ids", "crew")
+
+DOCUMENT_QUERY = f"""INSERT INTO movie_documents ({", ".join(DOCUMENT_FIELDS)})
+                 SELECT m.movie_id, m.title, m.release_date, m.score, m.overview,
+                     m.orig_title, m.status, m.language_id, m.budget, m.revenue,
+                     m.country_id, c.country, l.language,
+                     ARRAY(SELECT g.genre FROM genre_assignment ga
+                           JOIN genres g USING(genre_id)
+                           WHERE ga.movie_id = m.movie_id
+                           ORDER BY g.genre),
+                     ARRAY(SELECT DISTINCT ga.genre_id FROM genre_assignment ga
+                           WHERE ga.movie_id = m.movie_id),
+                     COALESCE((SELECT JSONB_AGG(JSONB_BUILD_OBJECT('actor', a.actor,
+                                                                   'role', r.role)
+                                                ORDER BY ca.crew_assignment_id)
+                               FROM crew_assignment ca
+                               JOIN actors a USING(actor_id)
+                               JOIN roles r USING(role_id)
+                               WHERE ca.movie_id = m.movie_id), '[]')
+                 FROM movies m
+                 LEFT JOIN countries c ON c.country_id = m.country_id
+                 LEFT JOIN languages l ON l.language_id = m.language_id
+                 WHERE {{where}}
+                 ORDER BY m.movie_id
+                 ON CONFLICT (movie_id) DO UPDATE
+                 SET {", ".join(f"{field} = EXCLUDED.{field}"
+                                for field in DOCUMENT_FIELDS if field != "movie_id")}"""
+
+
+def refresh_documents(cur, movie_ids: Iterable[int] | None = None) -> None:
+    """Rebuild the documents of movies from the normalised tables in the current
+    transaction, or of every movie when movie_ids is None"""
+    if movie_ids is None:
+        cur.execute(DOCUMENT_QUERY.format(where="TRUE"))
+        return
+
+    movie_ids = sorted(set(movie_ids))
+    if movie_ids:
+        cur.execute(DOCUMENT_QUERY.format(where="m.movie_id = ANY(%s::INT[])"), (movie_ids,))
@@ -0,0 +1,98 @@
+"""Named server-side prepared statements, created once per pooled connection
+
+Pooled connections are PreparedConnection instances that remember the statements
+prepared on them. execute_prepared prepares a query the first time a connection
+runs it and afterwards only sends EXECUTE with the parameters, so Postgres parses
+and plans it once per connection instead of on every call.
+
+Set PREPARED_STATEMENTS_MAX=0 to run every query as plain text, e.g. behind a
+pooler in transaction mode where sessions are not kept."""
+
+import re
+from hashlib import md5
+from os import environ
+from threading import Lock
+
+from psycopg2.extensions import connection, cursor
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+_EXECUTE = re.compile(r"^EXECUTE (\w+)")
+
+
+class PreparedConnection(connection):
+    """Connection that remembers the names of the statements prepared on it"""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.prepared: set[str] = set()
+
+
+class StatementRegistry:
+    """Process-wide names and prepared forms of up to max_size distinct queries.
+
+    Queries beyond max_size are not registered and run as plain text, so queries
+    built with unusual options cannot grow every connection's statements forever."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._statements: dict[str, tuple[str, str, int]] = {}
+        self._queries: dict[str, str] = {}
+        self._lock = Lock()
+
+    def get(self, query: str) -> tuple[str, str, int] | None:
+        """Get the name, the PREPARE body and the parameter count of a query written
+        with %s placeholders, registering it if there is room"""
+        statement = self._statements.get(query)
+        if statement is not None or len(self._statements) >= self.max_size:
+            return statement
+
+        count = 0
+
+        def number(match: re.Match) -> str:
+            nonlocal count
+            if match.group() == "%%":
+                return "%"
+            count += 1
+            return f"${count}"
+
+        body = _PLACEHOLDER.sub(number, query)
+        name = "stmt_" + md5(query.encode()).hexdigest()[:16]
+        with self._lock:
+            if len(self._statements) >= self.max_size:
+                return self._statements.get(query)
+            statement = self._statements.setdefault(query, (name, body, count))
+            self._queries[name] = query
+        return statement
+
+    def original(self, query) -> object:
+        """Get the query an EXECUTE of a registered statement runs, or query itself"""
+        match = _EXECUTE.match(query) if isinstance(query, str) else None
+        return self._queries.get(match.group(1), query) if match else query
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+
+registry = StatementRegistry(int(environ.get("PREPARED_STATEMENTS_MAX", 200)))
+
+
+def execute_prepared(cur: cursor, query: str, params: list | tuple = ()) -> None:
+    """Run a query as a prepared statement, preparing it on the cursor's connection
+    the first time that connection runs it.
+
+    Falls back to a plain execute on connections that are not PreparedConnections,
+    on named cursors and once the registry is full."""
+    conn = cur.connection
+    statement = registry.get(query) if isinstance(conn, PreparedConnection) \
+        and cur.name is None else None
+    if statement is None:
+        cur.execute(query, params)
+        return
+
+    name, body, count = statement
+    if name not in conn.prepared:
+        # Prepared statements outlive the transaction, even when it is rolled back
+        cur.execute(f"PREPARE {name} AS {body}")
+        conn.prepared.add(name)
+    cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * count)})" if count
+                else f"EXECUTE {name}", params)
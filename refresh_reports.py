@@ -0,0 +1,23 @@
+"""A script to refresh the precomputed reports behind the /stats endpoints,
+run after imports or on a schedule"""
+
+from argparse import ArgumentParser
+from time import perf_counter, sleep
+
+from database import refresh_reports
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Refresh the report views")
+    parser.add_argument("--every", type=float,
+                        help="keep refreshing every this many seconds instead of once")
+    args = parser.parse_args()
+
+    while True:
+        started = perf_counter()
+        refresh_reports()
+        print(f"Refreshed reports in {perf_counter() - started:.1f}s")
+
+        if args.every is None:
+            break
+        sleep(args.every)
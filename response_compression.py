@@ -0,0 +1,82 @@
+"""Negotiated gzip and brotli compression of responses
+
+brotli is optional: without it responses are only ever gzipped."""
+
+import gzip
+import zlib
+from typing import Iterable, Iterator
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html"}
+
+
+def choose_encoding(request: Request) -> str | None:
+    """Pick the best encoding the client accepts, preferring brotli"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress_stream(chunks: Iterable, encoding: str,
+                     flush_size: int = 16384) -> Iterator[bytes]:
+    """Compress a streamed body as it is produced, flushing whenever flush_size bytes
+    have gone in so clients receive rows soon after they are fetched"""
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=4)
+        compress, flush = compressor.process, compressor.flush
+    else:
+        compressor = zlib.compressobj(5, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        compress = compressor.compress
+
+        def flush() -> bytes:
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    pending = 0
+    for chunk in chunks:
+        chunk = chunk.encode() if isinstance(chunk, str) else chunk
+        output = compress(chunk)
+        pending += len(chunk)
+        if pending >= flush_size:
+            output += flush()
+            pending = 0
+        if output:
+            yield output
+
+    yield compressor.finish() if encoding == "br" else compressor.flush()
+
+
+def compress_response(response: Response, request: Request, min_size: int) -> Response:
+    """Compress a successful text response of at least min_size bytes, or any
+    streamed one, with the best encoding the client accepts"""
+    if response.status_code != 200 or "Content-Encoding" in response.headers \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    encoding = choose_encoding(request)
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        response.set_data(brotli.compress(body, quality=4) if encoding == "br"
+                          else gzip.compress(body, compresslevel=5))
+
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -1,6 +1,11 @@
 -- This file contains all of the SQL commands to create the database, tables and relationships for the Movies Database
 
-DROP TABLE IF EXISTS genre_assignment, genres, crew_assignment, roles, actors, movies, countries, languages;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+DROP MATERIALIZED VIEW IF EXISTS report_movies_per_country, report_genre_scores,
+    report_language_revenue, report_genre_country_counts;
+DROP TABLE IF EXISTS movie_documents, genre_assignment, genres, crew_assignment, roles, actors, movies, countries, languages, import_checkpoints,
+    table_versions;
 
 
 CREATE TABLE languages (
@@ -34,6 +39,8 @@ CREATE TABLE actors (
     actor VARCHAR UNIQUE NOT NULL
 );
 
+CREATE INDEX actors_actor_trgm_idx ON actors USING GIN (actor gin_trgm_ops);
+
 CREATE TABLE roles (
     role_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
     role VARCHAR UNIQUE NOT NULL
@@ -60,4 +67,106 @@ CREATE TABLE genre_assignment (
     genre_id INT NOT NULL,
     FOREIGN KEY (movie_id) REFERENCES movies ON DELETE CASCADE,
     FOREIGN KEY (genre_id) REFERENCES genres ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+CREATE TABLE import_checkpoints (
+    filename VARCHAR PRIMARY KEY,
+    rows_committed BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE table_versions (
+    table_name VARCHAR PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO table_versions (table_name)
+VALUES ('movies'), ('genre_assignment'), ('crew_assignment'), ('genres'),
+    ('countries'), ('languages'), ('actors'), ('roles');
+
+CREATE INDEX movies_country_id_idx ON movies (country_id, movie_id);
+CREATE INDEX movies_language_id_idx ON movies (language_id);
+CREATE INDEX movies_release_date_idx ON movies (release_date, movie_id);
+CREATE INDEX movies_score_idx ON movies (score, movie_id);
+CREATE INDEX genre_assignment_movie_id_idx ON genre_assignment (movie_id, genre_id);
+CREATE INDEX genre_assignment_genre_id_idx ON genre_assignment (genre_id, movie_id);
+CREATE INDEX crew_assignment_movie_id_idx ON crew_assignment (movie_id, actor_id);
+CREATE INDEX crew_assignment_actor_id_idx ON crew_assignment (actor_id);
+
+CREATE TABLE movie_documents (
+    movie_id INT PRIMARY KEY,
+    title VARCHAR NOT NULL,
+    release_date DATE NOT NULL,
+    score FLOAT NOT NULL,
+    overview VARCHAR NOT NULL,
+    orig_title VARCHAR NOT NULL,
+    status VARCHAR NOT NULL,
+    language_id INT,
+    budget FLOAT NOT NULL,
+    revenue FLOAT NOT NULL,
+    country_id INT,
+    country CHAR(2),
+    language VARCHAR,
+    genres VARCHAR[] NOT NULL DEFAULT '{}',
+    genre_ids INT[] NOT NULL DEFAULT '{}',
+    crew JSONB NOT NULL DEFAULT '[]',
+    genre_sort VARCHAR GENERATED ALWAYS AS (COALESCE(genres[1], '')) STORED,
+    search_document TSVECTOR GENERATED ALWAYS AS (
+        TO_TSVECTOR('english', title || ' ' || orig_title || ' ' || overview)
+    ) STORED,
+    FOREIGN KEY (movie_id) REFERENCES movies ON DELETE CASCADE
+);
+
+CREATE INDEX movie_documents_country_idx ON movie_documents (country, movie_id);
+CREATE INDEX movie_documents_genre_ids_idx ON movie_documents USING GIN (genre_ids);
+CREATE INDEX movie_documents_title_idx ON movie_documents (title, movie_id);
+CREATE INDEX movie_documents_release_date_idx
+ON movie_documents (release_date, movie_id);
+CREATE INDEX movie_documents_score_idx ON movie_documents (score, movie_id);
+CREATE INDEX movie_documents_genre_sort_idx
+ON movie_documents (genre_sort, movie_id);
+CREATE INDEX movie_documents_search_document_idx
+ON movie_documents USING GIN (search_document);
+CREATE INDEX movie_documents_title_trgm_idx
+ON movie_documents USING GIN (title gin_trgm_ops);
+
+CREATE MATERIALIZED VIEW report_movies_per_country AS
+SELECT country, COUNT(*) AS movie_count, MAX(budget) AS max_budget
+FROM movies
+JOIN countries USING(country_id)
+GROUP BY country;
+
+CREATE UNIQUE INDEX report_movies_per_country_idx
+ON report_movies_per_country (country);
+
+CREATE MATERIALIZED VIEW report_genre_scores AS
+SELECT genre, COUNT(*) AS movie_count, AVG(score) AS avg_score
+FROM movies
+JOIN genre_assignment USING(movie_id)
+JOIN genres USING(genre_id)
+GROUP BY genre;
+
+CREATE UNIQUE INDEX report_genre_scores_idx ON report_genre_scores (genre);
+
+CREATE MATERIALIZED VIEW report_language_revenue AS
+SELECT language, COUNT(*) AS movie_count, SUM(revenue) AS total_revenue
+FROM movies
+JOIN languages USING(language_id)
+GROUP BY language;
+
+CREATE UNIQUE INDEX report_language_revenue_idx
+ON report_language_revenue (language);
+
+CREATE MATERIALIZED VIEW report_genre_country_counts AS
+SELECT genre, country, COUNT(*) AS movie_count
+FROM genres
+JOIN genre_assignment USING(genre_id)
+JOIN movies USING(movie_id)
+JOIN countries USING(country_id)
+GROUP BY genre, country;
+
+CREATE UNIQUE INDEX report_genre_country_counts_idx
+ON report_genre_country_counts (genre, country);
+CREATE INDEX report_genre_country_counts_movie_count_idx
+ON report_genre_country_counts (movie_count DESC);
@@ -0,0 +1,157 @@
+"""Opt-in log of slow statements, aggregated by normalised query with a captured plan
+
+Enabled by database.py when SLOW_QUERY_MS is set. Every statement a timed cursor
+runs for longer than the threshold is logged with its parameters; the first time a
+query is slow, and whenever it is slower than ever before, its plan is captured
+on a background thread so the request that ran it is not delayed further."""
+
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from psycopg2 import Error
+# psycopg2 builds its errors module at import time, so pylint cannot see its classes
+from psycopg2.errors import ReadOnlySqlTransaction  # pylint: disable=no-name-in-module
+from psycopg2.extensions import connection, cursor
+
+from connection_pool import get_pool
+from metrics import on_query
+from prepared_statements import registry
+
+logger = logging.getLogger("slow_queries")
+
+_NORMALISE = [(re.compile(r"'(?:[^']|'')*'"), "?"),
+              (re.compile(r"%(?:\(\w+\))?s"), "?"),
+              (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+              (re.compile(r"\(\s*(?:\?\s*,\s*)*\?\s*\)"), "(...)"),
+              (re.compile(r"(?:\(\.\.\.\)\s*,\s*)+\(\.\.\.\)"), "(...)"),
+              (re.compile(r"\s+"), " ")]
+_EXPLAINABLE = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+
+
+def _short_repr(params, limit: int = 1000) -> str:
+    """Format parameters for the log, cutting long lists short"""
+    text = repr(params)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def normalise(query: str | bytes) -> str:
+    """Reduce a statement to its shape so runs with different values group together"""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    for pattern, replacement in _NORMALISE:
+        query = pattern.sub(replacement, query)
+    return query.strip()
+
+
+class SlowQueryLog:
+    """Statements slower than threshold_ms, grouped by normalised query"""
+
+    def __init__(self, threshold_ms: float, explain: bool = True,
+                 explain_timeout_ms: int = 30000) -> None:
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.explain_timeout_ms = explain_timeout_ms
+        self._entries: dict[str, dict] = {}
+        self._lock = Lock()
+        self._explainer = ThreadPoolExecutor(1, thread_name_prefix="slow-query-explain")
+
+    def record(self, function: str, query, params, seconds: float) -> None:
+        """Log a statement if it ran for longer than the threshold"""
+        milliseconds = seconds * 1000
+        if milliseconds < self.threshold_ms:
+            return
+
+        query = registry.original(query)
+        shape = normalise(query)
+        with self._lock:
+            entry = self._entries.setdefault(shape, {"query": shape,
+                                                     "function": function,
+                                                     "count": 0,
+                                                     "total_ms": 0.0,
+                                                     "max_ms": 0.0,
+                                                     "params": None,
+                                                     "plan": None})
+            entry["count"] += 1
+            entry["total_ms"] += milliseconds
+            slowest = milliseconds > entry["max_ms"]
+            if slowest:
+                entry["max_ms"] = milliseconds
+                entry["params"] = _short_repr(params)
+
+        logger.warning("Slow query in %s (%.1f ms): %s params=%s",
+                       function, milliseconds, shape, _short_repr(params))
+        if self.explain and slowest:
+            self._explainer.submit(self._capture_plan, shape, query, params)
+
+    def _capture_plan(self, shape: str, query, params) -> None:
+        """Explain a statement in a transaction that is always rolled back.
+
+        SELECT and WITH statements are run with ANALYZE in a read-only transaction;
+        if they lock or change rows, which a read-only transaction refuses, and for
+        every other statement the estimated plan is captured instead."""
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+
+        pool = get_pool()
+        conn = pool.getconn()
+        try:
+            try:
+                plan = self._explain(conn, query, params, bool(_EXPLAINABLE.match(query)))
+            except ReadOnlySqlTransaction:
+                conn.rollback()
+                plan = self._explain(conn, query, params, False)
+            conn.rollback()
+        except Error as e:
+            conn.rollback()
+            plan = f"Could not explain: {e}"
+        finally:
+            pool.putconn(conn)
+
+        with self._lock:
+            self._entries[shape]["plan"] = plan
+        logger.info("Plan for slow query %s\n%s", shape, plan)
+
+    def _explain(self, conn: connection, query: str, params, analyze: bool) -> str:
+        """Get the plan of a statement, running it when analyze is set"""
+        with conn.cursor(cursor_factory=cursor) as cur:
+            if analyze:
+                cur.execute("SET TRANSACTION READ ONLY")
+            cur.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}")
+            cur.execute(f"EXPLAIN ({'ANALYZE, BUFFERS' if analyze else 'VERBOSE'}) {query}",
+                        params)
+            return "\n".join(row[0] for row in cur.fetchall())
+
+    def entries(self) -> list[dict]:
+        """Get the slow queries, the most time consuming first"""
+        with self._lock:
+            entries = [{**entry,
+                        "total_ms": round(entry["total_ms"], 3),
+                        "mean_ms": round(entry["total_ms"] / entry["count"], 3),
+                        "max_ms": round(entry["max_ms"], 3)}
+                       for entry in self._entries.values()]
+        return sorted(entries, key=lambda entry: -entry["total_ms"])
+
+    def clear(self) -> None:
+        """Forget every slow query"""
+        with self._lock:
+            self._entries.clear()
+
+
+_log: SlowQueryLog | None = None
+
+
+def enable(threshold_ms: float, explain: bool = True) -> SlowQueryLog:
+    """Start logging statements slower than threshold_ms run by timed cursors"""
+    global _log  # pylint: disable=global-statement
+
+    if _log is None:
+        _log = SlowQueryLog(threshold_ms, explain)
+        on_query(_log.record)
+    return _log
+
+
+def get_slow_queries() -> list[dict] | None:
+    """Get the aggregated slow queries, or None when the log is not enabled"""
+    return _log.entries() if _log is not None else None
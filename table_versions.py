@@ -0,0 +1,27 @@
+"""Per-table change counters behind the ETag and Last-Modified of list responses
+
+Every write bumps the counters of the tables it changed in its own transaction,
+so readers see a new version exactly when they can see the new rows."""
+
+from datetime import datetime
+from typing import Iterable
+
+MOVIE_TABLES = ("movies", "genre_assignment", "crew_assignment", "genres",
+                "countries", "languages", "actors", "roles")
+
+
+def bump_versions(cur, tables: Iterable[str]) -> None:
+    """Record that tables changed in the current transaction"""
+    cur.execute("""UPDATE table_versions
+                SET version = version + 1, updated_at = NOW()
+                WHERE table_name = ANY(%s)""", (sorted(set(tables)),))
+
+
+def get_versions(cur, tables: Iterable[str]) -> tuple[str, datetime | None]:
+    """Get a version string that changes whenever any of the tables change,
+    and the time the most recent of them changed"""
+    cur.execute("""SELECT version, updated_at FROM table_versions
+                WHERE table_name = ANY(%s)
+                ORDER BY table_name""", (sorted(set(tables)),))
+    rows = cur.fetchall()
+    return ".".join(str(row[0]) for row in rows), max((row[1] for row in rows), default=None)
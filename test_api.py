@@ -1,10 +1,15 @@
+from datetime import date, datetime, timezone
+import gzip
+import json
 from typing import Generator
 from unittest.mock import patch
 
 from flask.testing import FlaskClient
+from psycopg2 import DataError, IntegrityError, OperationalError
 import pytest
 
-from api import app
+from api import app, encode_cursor, decode_cursor
+from database import CompactRows
 
 
 @pytest.fixture
@@ -14,6 +19,13 @@ def client() -> Generator:
         yield client
 
 
+@pytest.fixture(autouse=True)
+def table_versions() -> Generator:
+    with patch("api.get_table_versions",
+               return_value=("3.1", datetime(2024, 1, 1, tzinfo=timezone.utc))) as versions:
+        yield versions
+
+
 def test_endpoint_index(client: FlaskClient):
     response = client.get("/")
     assert response.status_code == 200
@@ -325,3 +337,332 @@ def test_endpoint_index(client: FlaskClient):
     response = client.get("/")
     assert response.status_code == 200
     assert response.json == {"message": "Welcome to the Movie API"}
+
+
+def test_invalid_limit(client: FlaskClient):
+    response = client.get("/movies?limit=0")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid limit parameter"}
+
+
+def test_invalid_fields(client: FlaskClient):
+    response = client.get("/movies?fields=title,password")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid fields parameter"}
+
+
+def test_invalid_after(client: FlaskClient):
+    response = client.get("/movies?after=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid cursor"}
+
+
+def test_after_from_other_sort_order(client: FlaskClient):
+    token = encode_cursor("title", "asc", ["Creed III", 1])
+    response = client.get(f"/movies?sort_by=title&sort_order=desc&after={token}")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid cursor"}
+
+
+def test_cursor_round_trip():
+    token = encode_cursor("release_date", "desc", [date(2023, 3, 2), 7])
+    assert decode_cursor(token, "release_date", "desc") == ["2023-03-02", 7]
+
+
+def test_after_from_other_search(client: FlaskClient):
+    token = encode_cursor(None, "asc", [4])
+    response = client.get(f"/movies?search=creed&after={token}")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid cursor"}
+
+
+def test_cursor_with_search_round_trip():
+    token = encode_cursor(None, "asc", [0.5, 4], "creed")
+    assert decode_cursor(token, None, "asc", "creed") == [0.5, 4]
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token, None, "asc")
+
+
+@pytest.mark.parametrize("sort_by, after", [
+    ("title", [1]),
+    ("title", ["Creed III", 1, 2]),
+    ("title", [["Creed III"], 1]),
+    ("score", ["7.3", 1]),
+    ("score", [True, 1]),
+    ("release_date", ["31/12/2022", 1]),
+    (None, ["1"]),
+    (None, [1.5]),
+])
+def test_cursor_with_wrong_keyset(sort_by: str | None, after: list):
+    token = encode_cursor(sort_by, "asc", after)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(token, sort_by, "asc")
+
+
+@patch("api.stream_movies_by_country", return_value=iter([{"title": "Creed III"},
+                                                          {"title": "Avatar"}]))
+@patch("api.get_countries", return_value=["AU"])
+def test_stream_movies_by_country(_get_countries, _stream, client: FlaskClient):
+    response = client.get("/countries/AU?stream=ndjson")
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()] == [
+        {"title": "Creed III"}, {"title": "Avatar"}]
+
+
+def test_invalid_stream(client: FlaskClient):
+    response = client.get("/genres/1/movies?stream=csv")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid stream parameter"}
+
+
+@patch("api.get_genres", return_value=[{"genre_id": 1, "genre": "Drama"}])
+def test_genres_not_modified(_get_genres, client: FlaskClient):
+    etag = client.get("/genres").headers["ETag"]
+    response = client.get("/genres", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+def test_invalid_ids(client: FlaskClient):
+    response = client.get("/movies?ids=1,two")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid ids parameter"}
+
+
+@patch("api.get_movie_details", return_value=[{"movie_id": 2}, {"movie_id": 1}])
+def test_get_movies_by_ids(get_movie_details, client: FlaskClient):
+    response = client.get("/movies?ids=2,1")
+    assert response.status_code == 200
+    assert response.json == [{"movie_id": 2}, {"movie_id": 1}]
+    get_movie_details.assert_called_once_with([2, 1])
+
+
+def test_patch_movie_without_fields(client: FlaskClient):
+    response = client.patch("/movies/1", json={})
+    assert response.status_code == 400
+    assert response.json == {"error": "No fields to update"}
+
+
+@patch("api.update_movie", return_value=None)
+def test_patch_missing_movie(_update_movie, client: FlaskClient):
+    response = client.patch("/movies/999999", json={"title": "New Title"})
+    assert response.status_code == 404
+    assert response.json == {"error": "Movie not found"}
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"release_date": "31/12/2022"}, "Invalid release_date format. Please use MM/DD/YYYY"),
+    ({"genre": ["Drama"]}, "Missing required fields: genre"),
+    ({"country": "Australia"}, "country must be a 2 letter code"),
+    ({"budget": "lots"}, "score, budget and revenue must be numbers"),
+])
+@patch("api.update_movie")
+def test_patch_movie_invalid_fields(update_movie, body: dict, error: str, client: FlaskClient):
+    response = client.patch("/movies/1", json=body)
+    assert response.status_code == 400
+    assert response.json == {"error": error}
+    update_movie.assert_not_called()
+
+
+@patch("api.update_movie", side_effect=IntegrityError(
+    'duplicate key value violates unique constraint "movies_title_key"'))
+def test_patch_movie_duplicate_title(_update_movie, client: FlaskClient):
+    response = client.patch("/movies/1", json={"title": "Avatar: The Way of Water"})
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid movie data: duplicate key value violates "
+                                      'unique constraint "movies_title_key"'}
+
+
+@patch("api.update_movie", side_effect=OperationalError("server closed the connection"))
+def test_patch_movie_database_error(_update_movie, client: FlaskClient):
+    response = client.patch("/movies/1", json={"title": "Creed III"})
+    assert response.status_code == 500
+    assert response.json == {"error": "Could not save the movie"}
+
+
+@patch("api.update_movie", return_value={"movie_id": 1, "title": "Creed III"})
+def test_patch_movie_parses_release_date(update_movie, client: FlaskClient):
+    response = client.patch("/movies/1", json={"release_date": "12/31/2022", "budget": 5})
+    assert response.status_code == 200
+    assert update_movie.call_args.args[1] == date(2022, 12, 31)
+    assert update_movie.call_args.args[6] == 5
+
+
+@patch("api.upsert_movies", return_value=[{"movie_id": 7, "title": "Creed III", "created": True}])
+def test_post_movie(upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama, Action",
+             "country": "AU", "language": "English", "score": 7.3, "orig_title": "Creed 3"}
+    response = client.post("/movies", json=movie)
+    assert response.status_code == 201
+    assert response.json["movie"] == {"movie_id": 7, "title": "Creed III", "created": True}
+    [saved] = upsert_movies.call_args.args[0]
+    assert saved["release_date"] == date(2023, 3, 2)
+    assert saved["score"] == 7.3
+    assert saved["orig_title"] == "Creed 3"
+
+
+@patch("api.upsert_movies", return_value=[{"movie_id": 7, "title": "Creed III", "created": False}])
+def test_post_movie_existing_title(_upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama",
+             "country": "AU", "language": "English"}
+    response = client.post("/movies", json=movie)
+    assert response.status_code == 200
+    assert response.json["message"] == "Movie updated successfully"
+
+
+@patch("api.upsert_movies")
+def test_post_movie_invalid_values(upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama",
+             "country": "Australia", "language": "English"}
+    response = client.post("/movies", json=movie)
+    assert response.status_code == 400
+    assert response.json == {"error": "country must be a 2 letter code"}
+    assert client.post("/movies", json=[movie]).status_code == 400
+    upsert_movies.assert_not_called()
+
+
+@patch("api.upsert_movies", return_value=[{"movie_id": 7, "title": "Creed III", "created": True}])
+def test_post_movies_batch(upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama, Action",
+             "country": "AU", "language": "English", "actors": ["Michael B. Jordan", "Adonis"]}
+    response = client.post("/movies/batch", json=[movie, movie, {"title": "No Date"}])
+    assert response.status_code == 200
+    assert response.json["created"] == 1
+    assert response.json["failed"] == 2
+    assert response.json["results"][1] == {"index": 1, "success": False,
+                                           "error": "Duplicate title in batch"}
+    assert upsert_movies.call_args.args[0][0]["release_date"] == date(2023, 3, 2)
+
+
+@patch("api.upsert_movies", return_value=[])
+def test_post_movies_batch_skips_invalid_values(upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama",
+             "country": "AU", "language": "English"}
+    response = client.post("/movies/batch", json=[{**movie, "country": "Australia"},
+                                                  {**movie, "score": True},
+                                                  {**movie, "overview": 1}])
+    assert response.status_code == 200
+    assert [result["error"] for result in response.json["results"]] == [
+        "country must be a 2 letter code",
+        "score, budget and revenue must be numbers",
+        "overview, orig_title and status must be strings"]
+    upsert_movies.assert_not_called()
+
+
+@patch("api.upsert_movies", side_effect=DataError("value too long"))
+def test_post_movies_batch_database_error(_upsert_movies, client: FlaskClient):
+    movie = {"title": "Creed III", "release_date": "03/02/2023", "genre": "Drama",
+             "country": "AU", "language": "English"}
+    response = client.post("/movies/batch", json=[movie])
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid movie data: value too long"}
+
+
+def test_post_movies_batch_ndjson(client: FlaskClient):
+    response = client.post("/movies/batch", data='{"title": "Creed III"}\n[1]\n',
+                           content_type="application/x-ndjson")
+    assert response.status_code == 200
+    assert [result["success"] for result in response.json["results"]] == [False, False]
+
+
+def test_post_movies_batch_invalid_body(client: FlaskClient):
+    response = client.post("/movies/batch", json={"title": "Creed III"})
+    assert response.status_code == 400
+
+
+def test_report_not_found(client: FlaskClient):
+    response = client.get("/stats/unknown")
+    assert response.status_code == 404
+    assert response.json == {"error": "Report not found"}
+
+
+def test_server_timing_header(client: FlaskClient):
+    response = client.get("/")
+    assert response.headers["Server-Timing"].startswith('db;dur=0.00;desc="0 queries, 0 rows"')
+
+
+@patch("api.get_pool_stats", return_value={"size": 2, "idle": 1})
+def test_metrics(_get_pool_stats, client: FlaskClient):
+    client.get("/")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/",status="200"}' in text
+    assert 'db_pool{pid=' in text
+
+
+@patch("api.JSON_FROM_DATABASE", True)
+@patch("api.get_movies", return_value=('[{"movie_id":1}]', [1]))
+def test_get_movies_json_from_database(get_movies, client: FlaskClient):
+    response = client.get("/movies?limit=1")
+    assert response.status_code == 200
+    assert response.json == [{"movie_id": 1}]
+    assert "X-Next-Cursor" in response.headers
+    assert get_movies.call_args.args[6] is True
+
+
+@patch("api.stream_movies_by_country", return_value=iter([["movie_id", "title"],
+                                                          (1, "Creed III"), (2, "Avatar")]))
+@patch("api.get_countries", return_value=["AU"])
+def test_stream_movies_by_country_columns(_get_countries, _stream, client: FlaskClient):
+    response = client.get("/countries/AU?stream=ndjson&format=columns")
+    assert response.status_code == 200
+    assert response.json == {"columns": ["movie_id", "title"],
+                             "rows": [[1, "Creed III"], [2, "Avatar"]]}
+
+
+@patch("api.stream_movies_by_country", return_value=iter([]))
+@patch("api.get_countries", return_value=["AU"])
+def test_stream_movies_by_country_columns_empty(_get_countries, _stream, client: FlaskClient):
+    response = client.get("/countries/AU?stream=ndjson&format=columns")
+    assert response.status_code == 200
+    assert response.json == {"columns": [], "rows": []}
+
+
+@patch("api.get_movies", return_value=(CompactRows(["movie_id"], [(1,), (2,)]), None))
+def test_get_movies_columns(_get_movies, client: FlaskClient):
+    response = client.get("/movies?format=columns")
+    assert response.status_code == 200
+    assert response.json == {"columns": ["movie_id"], "rows": [[1], [2]]}
+
+
+def test_invalid_format(client: FlaskClient):
+    response = client.get("/movies?format=csv")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid format parameter"}
+
+
+@patch("api.get_movies", return_value=([{"movie_id": 1}], None))
+def test_get_movies_etag(get_movies, client: FlaskClient):
+    response = client.get("/movies")
+    assert response.status_code == 200
+    assert response.headers["ETag"] == 'W/"3.1"'
+    assert response.headers["Last-Modified"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    response = client.get("/movies", headers={"If-None-Match": 'W/"3.1"'})
+    assert response.status_code == 304
+    assert get_movies.call_count == 1
+
+
+@patch("api.get_movies", return_value=([{"movie_id": 1}], None))
+def test_get_movies_changed_while_running(_get_movies, table_versions, client: FlaskClient):
+    table_versions.side_effect = [("3.1", None), ("4.1", None)]
+    response = client.get("/movies")
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+@patch("api.get_movies", return_value=([{"movie_id": movie_id, "title": "Movie"}
+                                        for movie_id in range(500)], None))
+def test_get_movies_compressed(_get_movies, client: FlaskClient):
+    response = client.get("/movies", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert json.loads(gzip.decompress(response.get_data())) == \
+        [{"movie_id": movie_id, "title": "Movie"} for movie_id in range(500)]
+
+
+def test_small_response_not_compressed(client: FlaskClient):
+    response = client.get("/", headers={"Accept-Encoding": "gzip, br"})
+    assert "Content-Encoding" not in response.headers
@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from connection_pool import ConnectionPool, PoolTimeout, get_connection
+
+
+@pytest.fixture
+def pool():
+    with patch("connection_pool.connect", side_effect=lambda **_: MagicMock(closed=0)):
+        yield ConnectionPool({}, min_size=1, max_size=2, timeout=0.05)
+
+
+def test_pool_reuses_returned_connection(pool: ConnectionPool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()["created"] == 1
+
+
+def test_pool_times_out_when_exhausted(pool: ConnectionPool):
+    pool.getconn()
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_pool_replaces_discarded_connection(pool: ConnectionPool):
+    conn = pool.getconn()
+    pool.putconn(conn, discard=True)
+    assert pool.getconn() is not conn
+    assert pool.stats()["discarded"] == 1
+
+
+def test_pool_replaces_unhealthy_connection(pool: ConnectionPool):
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 1
+    assert pool.getconn() is not conn
+    assert pool.stats()["failed_checks"] == 1
+    assert pool.stats()["discarded"] == 1
+    assert pool.stats()["created"] == 2
+
+
+def test_get_connection_returns_connection_of_closed_generator(pool: ConnectionPool):
+    def rows():
+        with get_connection() as conn:
+            yield conn
+            yield conn
+
+    with patch("connection_pool.get_pool", return_value=pool):
+        stream = rows()
+        conn = next(stream)
+        stream.close()
+
+    conn.rollback.assert_called()
+    conn.commit.assert_not_called()
+    assert pool.stats()["idle"] == 1
@@ -0,0 +1,70 @@
+from unittest.mock import MagicMock
+
+from dimension_cache import (
+    DimensionCache,
+    caches,
+    clear_caches,
+    discard_pending,
+    publish_pending,
+    resolve_ids
+)
+
+
+def test_cache_counts_hits_and_misses():
+    cache = DimensionCache("actors", "actor", "actor_id", max_size=10)
+    assert cache.get("Michael B. Jordan") is None
+    cache.put("Michael B. Jordan", 1)
+    assert cache.get("Michael B. Jordan") == 1
+    assert cache.stats() == {"size": 1, "max_size": 10, "hits": 1, "misses": 1}
+
+
+def test_cache_evicts_least_recently_used():
+    cache = DimensionCache("actors", "actor", "actor_id", max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_preloaded_cache_loads_table_once():
+    cache = DimensionCache("genres", "genre", "genre_id", preload=True)
+    cur = MagicMock()
+    cur.fetchall.return_value = [("Drama", 1), ("Action", 2)]
+    cache.load(cur)
+    cache.load(cur)
+    assert cur.execute.call_count == 1
+    assert cache.get("Action") == 2
+
+
+def lookup_cursor(rows: list[tuple]) -> MagicMock:
+    """Mock a cursor whose connection's lookup cursor returns rows"""
+    cur = MagicMock()
+    lookup = cur.connection.cursor.return_value.__enter__.return_value
+    lookup.fetchall.return_value = rows
+    return cur
+
+
+def test_resolved_ids_are_cached_after_commit():
+    clear_caches()
+    cur = lookup_cursor([("Michael B. Jordan", 7)])
+
+    assert resolve_ids(cur, "actors", [" Michael B. Jordan"]) == {"Michael B. Jordan": 7}
+    assert caches["actors"].get("Michael B. Jordan") is None
+    assert resolve_ids(cur, "actors", ["Michael B. Jordan"]) == {"Michael B. Jordan": 7}
+
+    publish_pending(cur.connection)
+    assert caches["actors"].get("Michael B. Jordan") == 7
+    clear_caches()
+
+
+def test_resolved_ids_are_dropped_on_rollback():
+    clear_caches()
+    cur = lookup_cursor([("Michael B. Jordan", 7)])
+
+    resolve_ids(cur, "actors", ["Michael B. Jordan"])
+    discard_pending(cur.connection)
+    publish_pending(cur.connection)
+    assert caches["actors"].get("Michael B. Jordan") is None
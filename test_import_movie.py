@@ -0,0 +1,116 @@
+from io import StringIO
+from unittest.mock import MagicMock
+
+import pytest
+from psycopg2 import OperationalError
+
+from benchmarks.common import (
+    apply_schema,
+    benchmark_settings,
+    create_database,
+    get_benchmark_connection
+)
+from connection_pool import reset_pool
+from dimension_cache import clear_caches
+from import_movie import (
+    bulk_import_movies,
+    clean_movie,
+    copy_csv_to_staging,
+    import_movies_to_database,
+    iter_csv,
+    parallel_import_movies,
+    stream_import_movies
+)
+
+CSV = ("title,release_date,score,genre,overview,crew,orig_title,status,language,"
+       "budget,revenue,country\n"
+       "Creed III,2023-03-02,73.0,\"Drama,\xa0Action\",\" After dominating boxing \","
+       "\"Michael B. Jordan,\xa0Adonis Creed,\xa0Tessa Thompson,\xa0Bianca Taylor\","
+       " Creed III , Released , English,75000000.00,271616668.0, AU\n"
+       "Avatar: The Way of Water,2022-12-15,78.0,\"Science Fiction,\xa0Adventure,\xa0Action\","
+       "Set more than a decade later,\"Sam Worthington,\xa0Jake Sully\","
+       "Avatar: The Way of Water,Released,English,460000000.0,2316794914.0,AU\n")
+
+
+def test_clean_movie_strips_names_in_strings_and_lists():
+    assert clean_movie({"title": " Creed III ",
+                        "genre": "Drama,\xa0Action",
+                        "crew": ["Michael B. Jordan ", "\xa0Adonis Creed"],
+                        "budget": 75000000}) == {"title": "Creed III",
+                                                 "genre": "Drama,Action",
+                                                 "crew": "Michael B. Jordan,Adonis Creed",
+                                                 "budget": 75000000}
+
+
+def test_copy_csv_to_staging_copies_clean_rows():
+    cur = MagicMock()
+    copied = []
+    cur.copy_expert.side_effect = lambda sql, buffer: copied.append(buffer.read())
+
+    assert copy_csv_to_staging(cur, StringIO(CSV), "movie_staging") == 2
+    assert len(copied) == 1
+    assert copied[0].splitlines()[0] == ("1,Creed III,2023-03-02,73.0,\"Drama,Action\","
+                                    "After dominating boxing,\"Michael B. Jordan,Adonis Creed,"
+                                    "Tessa Thompson,Bianca Taylor\",Creed III,Released,English,"
+                                    "75000000.00,271616668.0,AU")
+
+
+@pytest.fixture
+def import_database(monkeypatch):
+    """Point the pool at a fresh benchmark database, skipping without a server"""
+    settings = benchmark_settings()
+    try:
+        create_database(settings)
+    except OperationalError:
+        pytest.skip("No database server for the benchmark database")
+
+    for variable, setting in (("DATABASE_USERNAME", "user"), ("DATABASE_PASSWORD", "password"),
+                              ("DATABASE_IP", "host"), ("DATABASE_PORT", "port"),
+                              ("DATABASE_NAME", "database")):
+        monkeypatch.setenv(variable, settings[setting] or "")
+    yield settings
+    reset_pool()
+    clear_caches()
+
+
+def imported_rows(settings: dict, importer) -> dict:
+    """Import into an empty schema and read back everything the import stored"""
+    reset_pool()
+    clear_caches()
+    conn = get_benchmark_connection(settings)
+    apply_schema(conn)
+
+    importer()
+
+    with conn.cursor() as cur:
+        tables = {}
+        for name, query in (
+                ("movies", """SELECT title, release_date, score, overview, orig_title, status,
+                           language, budget, revenue, country FROM movies
+                           JOIN languages USING(language_id)
+                           JOIN countries USING(country_id)"""),
+                ("genres", """SELECT title, genre FROM genre_assignment
+                           JOIN movies USING(movie_id) JOIN genres USING(genre_id)"""),
+                ("crew", """SELECT title, actor, role FROM crew_assignment
+                         JOIN movies USING(movie_id) JOIN actors USING(actor_id)
+                         JOIN roles USING(role_id)"""),
+                ("documents", """SELECT title, country, language, genres, crew
+                              FROM movie_documents""")):
+            cur.execute(query)
+            tables[name] = sorted(cur.fetchall(), key=repr)
+    conn.close()
+    return tables
+
+
+def test_importers_store_the_same_rows(import_database, tmp_path):
+    filename = tmp_path / "movies.csv"
+    filename.write_text(CSV, encoding="utf-8")
+
+    expected = imported_rows(import_database,
+                             lambda: import_movies_to_database(iter_csv(filename)))
+    assert ("Creed III", "Drama") in expected["genres"]
+
+    for importer in (lambda: bulk_import_movies(filename),
+                     lambda: stream_import_movies(filename, chunk_size=1),
+                     lambda: parallel_import_movies(filename, workers=2, chunk_size=1)):
+        assert imported_rows(import_database, importer) == expected
@@ -0,0 +1,24 @@
+from datetime import date
+from decimal import Decimal
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider
+
+
+def test_orjson_provider_matches_default_provider():
+    app = Flask(__name__)
+    rows = [{"title": "Héroe", "release_date": date(2001, 6, 15), "score": 7.5,
+             "budget": Decimal("1000000.50"), "movie_id": 1}]
+
+    assert OrjsonProvider(app).dumps(rows) == \
+        DefaultJSONProvider(app).dumps(rows, ensure_ascii=False, separators=(",", ":"))
+
+
+def test_orjson_provider_response():
+    app = Flask(__name__)
+    with app.app_context():
+        response = OrjsonProvider(app).response({"b": 1, "a": date(2001, 6, 15)})
+    assert response.mimetype == "application/json"
+    assert response.get_data() == b'{"a":"Fri, 15 Jun 2001 00:00:00 GMT","b":1}\n'
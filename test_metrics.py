@@ -0,0 +1,33 @@
+from metrics import Histogram, end_trace, record_query, server_timing, start_trace
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/movies")
+    histogram.observe(0.5, "/movies")
+    histogram.observe(5, "/movies")
+
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{route="/movies",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/movies",le="1.0"} 2' in lines
+    assert 'latency_seconds_bucket{route="/movies",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{route="/movies"} 3' in lines
+
+
+def test_trace_collects_queries_until_ended():
+    start_trace()
+    record_query("get_movies", 0.002, 10)
+    record_query("get_countries", 0.001, -1)
+    assert end_trace() == [("get_movies", 0.002, 10), ("get_countries", 0.001, -1)]
+
+    record_query("get_movies", 0.002, 10)
+    assert not end_trace()
+
+
+def test_server_timing():
+    header = server_timing(0.010, [("get_countries", 0.001, 5),
+                                   ("get_movie_by_country", 0.004, 100)])
+    assert header == ('db;dur=5.00;desc="2 queries, 105 rows", '
+                      'q1;dur=1.00;desc="get_countries (5 rows)", '
+                      'q2;dur=4.00;desc="get_movie_by_country (100 rows)", '
+                      'app;dur=5.00, total;dur=10.00')
@@ -0,0 +1,35 @@
+from unittest.mock import MagicMock
+
+from database import movies_by_country_query, movies_by_genre_query
+from movie_documents import refresh_documents
+
+
+def test_refresh_documents_of_movies():
+    cur = MagicMock()
+    refresh_documents(cur, [3, 1, 3])
+
+    query, params = cur.execute.call_args.args
+    assert "m.movie_id = ANY(%s::INT[])" in query
+    assert "ON CONFLICT (movie_id) DO UPDATE" in query
+    assert params == ([1, 3],)
+
+
+def test_refresh_documents_of_every_movie():
+    cur = MagicMock()
+    refresh_documents(cur)
+
+    [query] = cur.execute.call_args.args
+    assert "WHERE TRUE" in query
+
+
+def test_refresh_documents_of_no_movies():
+    cur = MagicMock()
+    refresh_documents(cur, [])
+
+    cur.execute.assert_not_called()
+
+
+def test_list_queries_read_one_table():
+    for query, _ in (movies_by_genre_query(3, "genre"), movies_by_country_query("US", "title")):
+        assert "FROM movie_documents m" in query
+        assert "JOIN" not in query
@@ -0,0 +1,55 @@
+from unittest.mock import MagicMock
+
+from prepared_statements import PreparedConnection, StatementRegistry, execute_prepared
+import prepared_statements
+
+
+def test_registry_numbers_placeholders():
+    registry = StatementRegistry(10)
+    name, body, count = registry.get("SELECT * FROM movies WHERE title ILIKE %s "
+                                     "AND score > %s AND overview LIKE '50%%'")
+
+    assert name.startswith("stmt_")
+    assert body == "SELECT * FROM movies WHERE title ILIKE $1 AND score > $2 " \
+        "AND overview LIKE '50%'"
+    assert count == 2
+    assert registry.get("SELECT * FROM movies WHERE title ILIKE %s "
+                        "AND score > %s AND overview LIKE '50%%'")[0] == name
+    assert registry.original(f"EXECUTE {name} (%s, %s)").startswith("SELECT * FROM movies")
+
+
+def test_registry_stops_at_max_size():
+    registry = StatementRegistry(1)
+    assert registry.get("SELECT 1") is not None
+    assert registry.get("SELECT 2") is None
+    assert len(registry) == 1
+
+
+def test_execute_prepared_prepares_once_per_connection(monkeypatch):
+    monkeypatch.setattr(prepared_statements, "registry", StatementRegistry(10))
+    conn = MagicMock(spec=PreparedConnection)
+    conn.prepared = set()
+    cur = MagicMock(connection=conn)
+    cur.name = None
+
+    execute_prepared(cur, "SELECT genre FROM genres WHERE genre_id = %s", (3,))
+    execute_prepared(cur, "SELECT genre FROM genres WHERE genre_id = %s", (4,))
+
+    [name] = conn.prepared
+    assert [call.args for call in cur.execute.call_args_list] == [
+        (f"PREPARE {name} AS SELECT genre FROM genres WHERE genre_id = $1",),
+        (f"EXECUTE {name} (%s)", (3,)),
+        (f"EXECUTE {name} (%s)", (4,))]
+
+
+def test_execute_prepared_runs_plain_query_on_named_cursor(monkeypatch):
+    monkeypatch.setattr(prepared_statements, "registry", StatementRegistry(10))
+    conn = MagicMock(spec=PreparedConnection)
+    conn.prepared = set()
+    cur = MagicMock(connection=conn)
+    cur.name = "movie_stream"
+
+    execute_prepared(cur, "SELECT * FROM movies WHERE movie_id = %s", (1,))
+
+    cur.execute.assert_called_once_with("SELECT * FROM movies WHERE movie_id = %s", (1,))
+    assert not conn.prepared
@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+
+from psycopg2.errors import ReadOnlySqlTransaction  # pylint: disable=no-name-in-module
+
+from slow_query_log import SlowQueryLog, normalise
+import slow_query_log
+
+
+def test_normalise_groups_values():
+    assert normalise("SELECT * FROM movies\n  WHERE title = 'It''s' AND score > 7.5") == \
+        "SELECT * FROM movies WHERE title = ? AND score > ?"
+    assert normalise(b"INSERT INTO genres (genre) VALUES ('A'), ('B'), ('C')") == \
+        "INSERT INTO genres (genre) VALUES (...)"
+
+
+def test_slow_query_log_aggregates_by_query():
+    log = SlowQueryLog(threshold_ms=10, explain=False)
+    log.record("get_movies", "SELECT * FROM movies WHERE movie_id = 1", None, 0.005)
+    log.record("get_movies", "SELECT * FROM movies WHERE movie_id = 2", None, 0.020)
+    log.record("get_movies", "SELECT * FROM movies WHERE movie_id = %s", (3,), 0.040)
+
+    [entry] = log.entries()
+    assert entry["query"] == "SELECT * FROM movies WHERE movie_id = ?"
+    assert entry["count"] == 2
+    assert entry["max_ms"] == 40.0
+    assert entry["params"] == "(3,)"
+
+
+def explained_statements(monkeypatch, query: str, fail_read_only: bool = False) -> list:
+    """Capture the plan of a query on a mocked pool, returning the statements run"""
+    conn = MagicMock()
+    cur = conn.cursor.return_value.__enter__.return_value
+    cur.fetchall.return_value = [("Seq Scan on movies",)]
+
+    def execute(statement, _params=None):
+        if fail_read_only and statement.startswith("EXPLAIN (ANALYZE"):
+            raise ReadOnlySqlTransaction("cannot execute SELECT FOR UPDATE "
+                                         "in a read-only transaction")
+
+    cur.execute.side_effect = execute
+    monkeypatch.setattr(slow_query_log, "get_pool",
+                        lambda: MagicMock(getconn=MagicMock(return_value=conn)))
+
+    log = SlowQueryLog(threshold_ms=10, explain=False)
+    log.record("update_movie", query, None, 0.020)
+    log._capture_plan(normalise(query), query, None)  # pylint: disable=protected-access
+    assert log.entries()[0]["plan"] == "Seq Scan on movies"
+    return [call.args[0] for call in cur.execute.call_args_list]
+
+
+def test_capture_plan_analyzes_selects_read_only(monkeypatch):
+    statements = explained_statements(monkeypatch, "SELECT * FROM movies")
+    assert statements[0] == "SET TRANSACTION READ ONLY"
+    assert statements[-1] == "EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM movies"
+
+
+def test_capture_plan_falls_back_to_estimate_for_locking_selects(monkeypatch):
+    query = "SELECT movie_id FROM movies WHERE movie_id = 1 FOR UPDATE"
+    statements = explained_statements(monkeypatch, query, fail_read_only=True)
+    assert statements[-1] == f"EXPLAIN (VERBOSE) {query}"
+    assert "SET TRANSACTION READ ONLY" not in statements[statements.index(
+        f"EXPLAIN (ANALYZE, BUFFERS) {query}") + 1:]
+
+
+def test_capture_plan_estimates_writes(monkeypatch):
+    statements = explained_statements(monkeypatch, "DELETE FROM movies WHERE movie_id = 1")
+    assert statements == ["SET LOCAL statement_timeout = 30000",
+                          "EXPLAIN (VERBOSE) DELETE FROM movies WHERE movie_id = 1"]
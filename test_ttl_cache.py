@@ -0,0 +1,63 @@
+from unittest.mock import patch
+
+from ttl_cache import ttl_cache
+
+
+def test_ttl_cache_reuses_result_until_expiry():
+    calls = []
+
+    @ttl_cache(10)
+    def get(value):
+        calls.append(value)
+        return value * 2
+
+    with patch("ttl_cache.monotonic", return_value=0):
+        assert get(2) == 4
+        assert get(2) == 4
+    with patch("ttl_cache.monotonic", return_value=11):
+        assert get(2) == 4
+    assert calls == [2, 2]
+
+
+def test_ttl_cache_clear():
+    calls = []
+
+    @ttl_cache(10)
+    def get():
+        calls.append(1)
+        return len(calls)
+
+    assert get() == 1
+    get.cache_clear()
+    assert get() == 2
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    calls = []
+
+    @ttl_cache(10, max_size=2)
+    def count(value):
+        calls.append(value)
+        return value
+
+    count(1)
+    count(2)
+    count(1)
+    count(3)
+    count(1)
+    count(2)
+    assert calls == [1, 2, 3, 2]
+    assert count.cache_size() == 2
+
+
+def test_ttl_cache_drops_expired_results():
+    @ttl_cache(10)
+    def get(value):
+        return value
+
+    with patch("ttl_cache.monotonic", return_value=0):
+        for value in range(100):
+            get(value)
+    with patch("ttl_cache.monotonic", return_value=11):
+        get(-1)
+    assert get.cache_size() == 1
@@ -0,0 +1,51 @@
+"""Time-limited memoisation for queries whose results rarely change"""
+
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from time import monotonic
+from typing import Callable
+
+
+def ttl_cache(seconds: float, max_size: int = 1024) -> Callable:
+    """Cache a function's result per argument tuple for a number of seconds.
+
+    At most max_size results are kept, evicting the least recently used, and
+    expired results are dropped whenever a new one is cached, so callers that pass
+    many distinct arguments cannot grow the cache without bound.
+    The decorated function gains a cache_clear() method for explicit invalidation."""
+    def decorator(function: Callable) -> Callable:
+        entries: OrderedDict[tuple, tuple[float, object]] = OrderedDict()
+        lock = Lock()
+
+        @wraps(function)
+        def wrapper(*args):
+            now = monotonic()
+            with lock:
+                entry = entries.get(args)
+                if entry is not None and entry[0] > now:
+                    entries.move_to_end(args)
+                    return entry[1]
+
+            value = function(*args)
+            with lock:
+                for key in [key for key, (expires, _) in entries.items() if expires <= now]:
+                    del entries[key]
+                entries[args] = (now + seconds, value)
+                entries.move_to_end(args)
+                if len(entries) > max_size:
+                    entries.popitem(last=False)
+            return value
+
+        def cache_clear() -> None:
+            with lock:
+                entries.clear()
+
+        def cache_size() -> int:
+            with lock:
+                return len(entries)
+
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_size = cache_size
+        return wrapper
+    return decorator